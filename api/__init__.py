@@ -1,13 +1,54 @@
-from flask import Flask
+import os
+from io import BytesIO
+from flask import Flask, Request
 from dotenv import load_dotenv
 
+
+# uploads stay in memory instead of Werkzeug's temp files (anything over
+# 500 KB); MAX_UPLOAD_BYTES bounds them via MAX_CONTENT_LENGTH (413)
+class InMemoryUploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return BytesIO()
+
+
 def create_app():
     load_dotenv()
 
     app = Flask(__name__)
+    app.request_class = InMemoryUploadRequest
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_BYTES', str(64 * 1024 * 1024)))
+
+    # Apply pending schema migrations on startup when enabled
+    if os.getenv('AUTO_MIGRATE') == '1':
+        import migrate
+        migrate.run_migrations()
 
     # Import and register your routes
     from .routes import api_routes
     app.register_blueprint(api_routes)
 
+    # Background job threads start in each worker process on its first
+    # request (after any gunicorn fork) and pick up interrupted jobs
+    from . import jobs
+
+    @app.before_request
+    def _start_jobs():
+        jobs.ensure_started()
+
+    # Per-request timing and query counts (see metrics.py)
+    import metrics
+    from flask import request
+
+    @app.before_request
+    def _start_timer():
+        metrics.start_request()
+
+    @app.after_request
+    def _record_request(response):
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        state = metrics.finish_request(route, request.method, response.status_code)
+        if state:
+            response.headers['Server-Timing'] = f"app;dur={state['elapsed'] * 1000:.1f}, db;dur={state['db_time'] * 1000:.1f};desc=\"{state['queries']} queries\""
+        return response
+
     return app
@@ -0,0 +1,170 @@
+# ===== FILE: api/cache.py =====
+# In-process LRU cache for JSON GET responses, served with ETag /
+# Last-Modified so clients can revalidate with a cheap 304.
+# Entries are keyed by namespace + normalized query args and can be
+# tagged with the exam ids they contain, so mutations drop exactly the
+# listings that include the changed exams.
+# With RESPONSE_CACHE_SHARED=1 every namespace also carries a
+# generation number in Postgres (cache_generations), bumped on each
+# invalidation, so a mutation handled by one worker expires the
+# entries cached by all the others.
+import os
+import time
+import hashlib
+import threading
+import traceback
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask import Response, current_app, request
+import db as dbmod
+
+CACHE_ENABLED = os.getenv('RESPONSE_CACHE', '1') == '1'
+CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '256'))
+CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '300'))
+CACHE_SHARED = os.getenv('RESPONSE_CACHE_SHARED', '0') == '1'
+
+
+class CacheEntry:
+    __slots__ = ('body', 'etag', 'last_modified', 'exam_ids', 'generation', 'created')
+
+    def __init__(self, body, exam_ids, generation):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.exam_ids = frozenset(exam_ids) if exam_ids is not None else None
+        self.generation = generation
+        self.created = time.monotonic()
+
+
+class ResponseCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL, shared=CACHE_SHARED):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # bumped on every local invalidation; a miss computed before an
+        # invalidation is not stored after it
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @staticmethod
+    def make_key(namespace, args):
+        return (namespace, tuple(sorted((k, v.strip()) for k, v in args.items() if v is not None and v.strip() != '')))
+
+    # --------- shared generations ----------
+    def _generation(self, namespace):
+        if not self.shared:
+            return 0
+        rows = dbmod.fetchall('SELECT generation FROM cache_generations WHERE namespace=%s', (namespace,))
+        return rows[0]['generation'] if rows else 0
+
+    def _bump(self, namespace):
+        dbmod.execute("""
+            INSERT INTO cache_generations (namespace, generation, updated_at) VALUES (%s, 1, NOW())
+            ON CONFLICT (namespace) DO UPDATE SET generation = cache_generations.generation + 1, updated_at = NOW()
+        """, (namespace,))
+
+    # --------- entries ----------
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    # → (entry or None, token); pass the token back to put()
+    def get(self, key):
+        generation = self._generation(key[0])
+        with self._lock:
+            token = (self._versions.get(key[0], 0), generation)
+            entry = self._entries.get(key)
+            if entry is not None and (entry.generation != generation or (self.ttl and time.monotonic() - entry.created > self.ttl)):
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self._counters['misses'] += 1
+                return None, token
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry, token
+
+    def put(self, key, body, exam_ids=None, token=(0, 0)):
+        version, generation = token
+        entry = CacheEntry(body, exam_ids, generation)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if self._versions.get(key[0], 0) != version:
+                return entry
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+        return entry
+
+    # drop a namespace, or only its entries that contain one of exam_ids
+    def invalidate(self, namespace, exam_ids=None):
+        exam_ids = set(exam_ids) if exam_ids is not None else None
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            for key in [k for k, e in self._entries.items() if k[0] == namespace and
+                        (exam_ids is None or e.exam_ids is None or e.exam_ids & exam_ids)]:
+                self._drop(key)
+                self._counters['invalidations'] += 1
+        if self.shared:
+            self._bump(namespace)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._bytes,
+                        max_entries=self.max_entries, max_bytes=self.max_bytes, shared=self.shared)
+
+
+response_cache = ResponseCache()
+
+# ---------------------------------------------------------
+# cached_json(namespace, producer)
+# producer() → (payload, exam_ids or None); only called on a miss.
+# Answers 304 when If-None-Match / If-Modified-Since still match.
+# ---------------------------------------------------------
+# args default to the query string; store defaults to response_cache
+def cached_json(namespace, producer, args=None, store=None):
+    if not CACHE_ENABLED:
+        payload, _ = producer()
+        return _conditional(CacheEntry(_dumps(payload), None, 0), 'MISS')
+    store = store or response_cache
+    key = ResponseCache.make_key(namespace, request.args if args is None else args)
+    entry, token = store.get(key)
+    state = 'HIT'
+    if entry is None:
+        payload, exam_ids = producer()
+        entry = store.put(key, _dumps(payload), exam_ids, token)
+        state = 'MISS'
+    return _conditional(entry, state)
+
+def _dumps(payload):
+    return current_app.json.dumps(payload).encode('utf-8')
+
+def _conditional(entry, state):
+    response = Response(entry.body, status=200, mimetype='application/json')
+    response.set_etag(entry.etag)
+    response.last_modified = entry.last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Cache'] = state
+    return response.make_conditional(request)
+
+def invalidate(namespace, exam_ids=None, store=None):
+    try:
+        (store or response_cache).invalidate(namespace, exam_ids)
+    except Exception:
+        # a failed shared bump must not fail the mutation itself
+        traceback.print_exc()
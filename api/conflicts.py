@@ -0,0 +1,62 @@
+# ===== FILE: api/conflicts.py =====
+# Exam clashes: a student registered for two or more exams that run in
+# the same day/period slot. One set-based query joins registration to
+# every exam of the affected slots (hash join on program/course) and
+# groups by (student, slot); no per-exam round trips.
+import os
+
+# refuse to seat an exam whose students have clashes (409) unless ?force=1
+BLOCK_ON_CONFLICTS = os.getenv('SEATING_BLOCK_ON_CONFLICTS', '0') == '1'
+
+# {where_sql} selects the exams of interest (alias e); clashes are checked
+# against every exam sharing a slot with them, so a filtered view still
+# sees clashes with exams outside the filter
+CONFLICTS_SQL = """
+WITH focus AS (
+    SELECT e.Exam_id FROM exam e {where_sql}
+), slots AS (
+    SELECT DISTINCT e.day, e.period_id, e.date FROM exam e WHERE e.Exam_id IN (SELECT Exam_id FROM focus)
+), slot_exams AS (
+    SELECT x.Exam_id AS exam_id, x.program, x.code_course, x.day, x.period_id, x.date,
+           x.Exam_id IN (SELECT Exam_id FROM focus) AS in_focus
+    FROM exam x
+    JOIN slots s ON x.day IS NOT DISTINCT FROM s.day AND x.period_id IS NOT DISTINCT FROM s.period_id
+                AND x.date IS NOT DISTINCT FROM s.date
+), hits AS (
+    SELECT r.student_ID AS student_id, r.student_name, se.*
+    FROM slot_exams se
+    JOIN registration r ON r.program = UPPER(se.program) AND r.course = se.code_course
+)
+SELECT student_id, MAX(student_name) AS student_name, day, period_id, date,
+       json_agg(json_build_object('exam_id', exam_id, 'program', program, 'code_course', code_course) ORDER BY exam_id) AS exams
+FROM hits
+GROUP BY student_id, day, period_id, date
+HAVING COUNT(DISTINCT exam_id) > 1 AND bool_or(in_focus)
+ORDER BY date, day, period_id, student_id
+"""
+
+
+def find_conflicts(cur, where_sql='', params=()):
+    cur.execute(CONFLICTS_SQL.format(where_sql=where_sql), list(params))
+    out = []
+    for row in cur.fetchall():
+        out.append({
+            'student_id': row['student_id'],
+            'student_name': row['student_name'],
+            'day': row['day'],
+            'period_id': row['period_id'],
+            'date': str(row['date']) if row['date'] else None,
+            'exams': row['exams'],
+        })
+    return out
+
+def exam_conflicts(cur, exam_id):
+    return find_conflicts(cur, 'WHERE e.Exam_id = %s', (exam_id,))
+
+# one entry per exam with the number of its students that clash
+def summarize(conflicts):
+    per_exam = {}
+    for c in conflicts:
+        for ex in c['exams']:
+            per_exam[ex['exam_id']] = per_exam.get(ex['exam_id'], 0) + 1
+    return [{'exam_id': k, 'students': v} for k, v in sorted(per_exam.items())]
@@ -0,0 +1,137 @@
+# ===== FILE: api/history.py =====
+# Seat history (student_legan_history): one row per seat assigned,
+# reassigned or unassigned, written in bulk by the seating CTEs.
+# The table is partitioned per academic year (migrations/0008):
+#   python -m api.history ensure            → partitions for this year and the next
+#   python -m api.history archive 2023      → detach the years starting before
+#                                             2023, export them to
+#                                             HISTORY_ARCHIVE_DIR as csv.gz, drop them
+#   python -m api.history list
+# page() backs the paginated /api/v1/history endpoint.
+import os
+import re
+import sys
+import gzip
+import db as dbmod
+
+HISTORY_ARCHIVE_DIR = os.getenv('HISTORY_ARCHIVE_DIR', os.path.join('uploads', 'history_archive'))
+PARTITION_RE = re.compile(r'^student_legan_history_y(\d{4})$')
+
+# newest first; keyset on (created_at, id)
+PAGE_SQL = """
+    SELECT h.id, h.created_at, h.action, h.exam_id, h.student_id, h.legan_id,
+           l.legan_name, e.code_course, e.program, e.day, e.period_id, e.date
+    FROM student_legan_history h
+    LEFT JOIN legan l ON l.Legan_id = h.legan_id
+    LEFT JOIN exam e ON e.Exam_id = h.exam_id
+    {where_sql}
+    ORDER BY h.created_at DESC, h.id DESC
+    LIMIT %s
+"""
+
+# filters: student_id, exam_id, action, since, until (timestamps);
+# cursor: (created_at iso, id) of the last row of the previous page.
+# → (rows, next cursor or None)
+def page(cur, filters, limit, cursor=None):
+    where, params = [], []
+    for col, key in (('h.student_id', 'student_id'), ('h.exam_id', 'exam_id'), ('h.action', 'action')):
+        if filters.get(key):
+            where.append(f'{col} = %s')
+            params.append(filters[key])
+    if filters.get('since'):
+        where.append('h.created_at >= %s::timestamp')
+        params.append(filters['since'])
+    if filters.get('until'):
+        where.append('h.created_at < %s::timestamp')
+        params.append(filters['until'])
+    if cursor:
+        where.append('(h.created_at, h.id) < (%s::timestamp, %s)')
+        params.extend(cursor)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ''
+    cur.execute(PAGE_SQL.format(where_sql=where_sql), params + [limit + 1])
+    rows = cur.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [{
+        'id': r['id'],
+        'created_at': r['created_at'].isoformat() if r['created_at'] else None,
+        'action': r['action'],
+        'exam_id': r['exam_id'],
+        'student_id': r['student_id'],
+        'legan_id': r['legan_id'],
+        'legan_name': r['legan_name'],
+        'code_course': r['code_course'],
+        'program': r['program'],
+        'day': r['day'],
+        'period_id': r['period_id'],
+        'date': str(r['date']) if r['date'] else None,
+    } for r in rows]
+    next_cursor = [items[-1]['created_at'], items[-1]['id']] if has_more and items else None
+    return items, next_cursor
+
+# --------- partitions ----------
+def partitions(cur):
+    cur.execute("""
+        SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound,
+               pg_total_relation_size(c.oid) AS bytes
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'student_legan_history'::regclass
+        ORDER BY c.relname
+    """)
+    return cur.fetchall()
+
+def ensure_partitions(cur, years_ahead=1):
+    created = []
+    for n in range(years_ahead + 1):
+        cur.execute("SELECT history_ensure_partition((NOW() + make_interval(years => %s))::timestamp) AS name", (n,))
+        created.append(cur.fetchone()['name'])
+    return created
+
+# detach, export and drop the year partitions that start before year
+# → [{'partition', 'file', 'rows'}]
+def archive(cur, before_year, out_dir=HISTORY_ARCHIVE_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    done = []
+    for p in partitions(cur):
+        m = PARTITION_RE.match(p['name'])
+        if not m or int(m.group(1)) >= int(before_year):
+            continue
+        name = p['name']
+        cur.execute(f'ALTER TABLE student_legan_history DETACH PARTITION {name}')
+        cur.execute(f'SELECT COUNT(*) AS n FROM {name}')
+        rows = cur.fetchone()['n']
+        path = os.path.join(out_dir, f'{name}.csv.gz')
+        tmp = path + '.tmp'
+        with gzip.open(tmp, 'wt', encoding='utf-8', newline='') as fh:
+            cur.copy_expert(f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)', fh)
+        os.replace(tmp, path)
+        cur.execute(f'DROP TABLE {name}')
+        done.append({'partition': name, 'file': path, 'rows': rows})
+    return done
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+    dbmod.DATABASE_URL = os.getenv('DATABASE_URL')
+    argv = sys.argv[1:] if argv is None else argv
+    cmd = argv[0] if argv else 'list'
+    with dbmod.get_cursor(True) as (conn, cur):
+        if cmd == 'ensure':
+            for name in ensure_partitions(cur):
+                print(name)
+        elif cmd == 'archive' and len(argv) == 2 and argv[1].isdigit():
+            for item in archive(cur, int(argv[1])):
+                print(f"{item['partition']}: {item['rows']} rows → {item['file']}")
+        elif cmd == 'list':
+            for p in partitions(cur):
+                print(f"{p['name']:<36} {p['bound']:<70} {p['bytes'] // 1024} KB")
+        else:
+            print('usage: python -m api.history [list | ensure | archive <year>]', file=sys.stderr)
+            return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# ===== FILE: api/idempotency.py =====
+# Idempotency-Key support for the mutation endpoints.
+# The first request with a given key (per endpoint) claims a row in
+# idempotency_keys, runs, and stores its JSON response; a retry with the
+# same key gets the stored response back (Idempotent-Replayed: true)
+# instead of running again. Reusing a key for a different request is a
+# 422, a retry while the first one still runs is a 409. 5xx responses are
+# not stored so the client can retry them. Keys expire after
+# IDEMPOTENCY_TTL_HOURS; a claim that never got a response (its worker
+# was killed) is released after IDEMPOTENCY_INFLIGHT_SECONDS, by default
+# the gunicorn request timeout.
+import os
+import hashlib
+import traceback
+from functools import wraps
+from flask import Response, current_app, jsonify, request
+from werkzeug.exceptions import HTTPException
+import db as dbmod
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_INFLIGHT_SECONDS = float(os.getenv('IDEMPOTENCY_INFLIGHT_SECONDS', os.getenv('GUNICORN_TIMEOUT', '120')))
+HASH_CHUNK_SIZE = 64 * 1024
+HEADER = 'Idempotency-Key'
+
+
+# form posts are hashed field by field and uploads straight from their
+# streams, so a large file is not buffered a second time
+def request_hash():
+    h = hashlib.sha256()
+    h.update(request.method.encode())
+    h.update(request.full_path.encode('utf-8'))
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        for name, value in sorted(request.form.items(multi=True)):
+            h.update(f'\0{name}={value}'.encode('utf-8'))
+        for name, upload in sorted(request.files.items(multi=True), key=lambda item: (item[0], item[1].filename or '')):
+            h.update(f'\0{name}:{upload.filename}:'.encode('utf-8'))
+            for chunk in iter(lambda: upload.stream.read(HASH_CHUNK_SIZE), b''):
+                h.update(chunk)
+            upload.stream.seek(0)
+    else:
+        h.update(request.get_data(cache=True))
+    return h.hexdigest()
+
+# → None when the key is ours now, else the existing row
+def claim(key, endpoint, digest):
+    with dbmod.get_cursor(True) as (conn, cur):
+        cur.execute("""
+            DELETE FROM idempotency_keys
+            WHERE created_at < NOW() - make_interval(hours => %s)
+               OR (status_code IS NULL AND created_at < NOW() - make_interval(secs => %s))
+        """, (IDEMPOTENCY_TTL_HOURS, IDEMPOTENCY_INFLIGHT_SECONDS))
+        cur.execute("""
+            INSERT INTO idempotency_keys (key, endpoint, request_hash) VALUES (%s, %s, %s)
+            ON CONFLICT (key, endpoint) DO NOTHING RETURNING key
+        """, (key, endpoint, digest))
+        if cur.fetchone():
+            return None
+        cur.execute('SELECT request_hash, status_code, body FROM idempotency_keys WHERE key=%s AND endpoint=%s', (key, endpoint))
+        return cur.fetchone()
+
+def store(key, endpoint, response):
+    if response.status_code >= 500 or not response.is_json:
+        dbmod.execute('DELETE FROM idempotency_keys WHERE key=%s AND endpoint=%s', (key, endpoint))
+    else:
+        dbmod.execute('UPDATE idempotency_keys SET status_code=%s, body=%s WHERE key=%s AND endpoint=%s',
+                      (response.status_code, response.get_data(as_text=True), key, endpoint))
+
+def idempotent(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.headers.get(HEADER) or '').strip()
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({'error': f'{HEADER} is too long'}), 400
+        endpoint = f'{request.method} {request.path}'
+        try:
+            digest = request_hash()
+            existing = claim(key, endpoint, digest)
+        except HTTPException:
+            # e.g. 413 for an upload over MAX_UPLOAD_BYTES
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            return jsonify({'error': str(e)}), 500
+        if existing is not None:
+            if existing['request_hash'] != digest:
+                return jsonify({'error': f'{HEADER} was already used for a different request'}), 422
+            if existing['status_code'] is None:
+                return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+            resp = Response(existing['body'], status=existing['status_code'], mimetype='application/json')
+            resp.headers['Idempotent-Replayed'] = 'true'
+            return resp
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            dbmod.execute('DELETE FROM idempotency_keys WHERE key=%s AND endpoint=%s', (key, endpoint))
+            raise
+        try:
+            store(key, endpoint, response)
+        except Exception:
+            traceback.print_exc()
+        return response
+    return wrapper
@@ -0,0 +1,283 @@
+# ===== FILE: api/importer.py =====
+# Bulk import of master data (rooms, students, registration, exams,
+# legans) from xlsx / csv uploads:
+#   read   → chunks of IMPORT_CHUNK_ROWS rows straight from the upload
+#            stream (openpyxl read-only for xlsx, pandas for csv); the
+#            app keeps uploads in memory (api.InMemoryUploadRequest)
+#   check  → vectorized pandas coercion; bad rows are rejected with
+#            their sheet row number and reasons
+#   load   → COPY per chunk; keyed tables (exam, legan) go through a
+#            temp staging table and INSERT ... ON CONFLICT. The other
+#            tables have no unique key, so their rows are always appended
+#            and on_conflict is refused for them
+# pandas / openpyxl are imported on first use, not at app start.
+import io
+import os
+
+IMPORT_CHUNK_ROWS = int(os.getenv('IMPORT_CHUNK_ROWS', '5000'))
+IMPORT_MAX_REPORTED = int(os.getenv('IMPORT_MAX_REPORTED_REJECTIONS', '1000'))
+
+
+class ImportFileError(ValueError):
+    pass
+
+
+# column → (kind, required, extra rules)
+#   kind: 'str' | 'upper' (str, upper-cased) | 'int'
+#   rules: {'min': n}
+SPECS = {
+    'rooms': {
+        'table': 'rooms',
+        'key': None,
+        'columns': {
+            'room_name': ('str', True, {}),
+            'capacity': ('int', True, {'min': 1}),
+            'floor': ('str', False, {}),
+        },
+    },
+    'students': {
+        'table': 'students',
+        'key': None,
+        'columns': {
+            'student_ID': ('str', True, {}),
+            'NID': ('str', False, {}),
+            'Arab_name': ('str', False, {}),
+            'Eng_name': ('str', False, {}),
+            'HNU_email': ('str', False, {}),
+            'phone_number': ('str', False, {}),
+            'parent_number': ('str', False, {}),
+            'address': ('str', False, {}),
+            'medical_status': ('str', False, {}),
+        },
+    },
+    'registration': {
+        'table': 'registration',
+        'key': None,
+        'columns': {
+            'NID': ('str', False, {}),
+            'level': ('str', False, {}),
+            'student_ID': ('str', True, {}),
+            'course': ('str', True, {}),
+            'student_group': ('str', False, {}),
+            'student_name': ('str', False, {}),
+            'payment': ('str', False, {}),
+            'program': ('upper', True, {}),
+            'notes': ('str', False, {}),
+        },
+    },
+    'exams': {
+        'table': 'exam',
+        'key': 'Exam_id',
+        'columns': {
+            'Exam_id': ('int', True, {'min': 1}),
+            'year': ('str', False, {}),
+            'semester': ('str', False, {}),
+            'type': ('str', False, {}),
+            'period_id': ('str', False, {}),
+            'date': ('str', False, {}),
+            'program': ('upper', True, {}),
+            'code_course': ('str', True, {}),
+            'day': ('str', False, {}),
+            'level': ('str', False, {}),
+        },
+    },
+    'legans': {
+        'table': 'legan',
+        'key': 'Legan_id',
+        'columns': {
+            'Legan_id': ('int', True, {'min': 1}),
+            'legan_name': ('str', True, {}),
+            'room_id': ('int', False, {}),
+            'level': ('str', False, {}),
+            'capacity': ('int', True, {'min': 0}),
+            'full_capacity': ('int', False, {'min': 0}),
+            'program': ('upper', True, {}),
+        },
+    },
+}
+
+# --------- readers ----------
+# each yields (DataFrame of raw cell values, sheet row numbers)
+def _xlsx_chunks(stream, chunk_rows):
+    import pandas as pd
+    from openpyxl import load_workbook
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h).strip() if h is not None else '' for h in header]
+        width = len(header)
+        buf, numbers = [], []
+        for number, row in enumerate(rows, start=2):
+            if row is None or all(v is None or v == '' for v in row):
+                continue
+            row = tuple(row[:width])
+            buf.append(row + (None,) * (width - len(row)))
+            numbers.append(number)
+            if len(buf) >= chunk_rows:
+                yield pd.DataFrame(buf, columns=header), numbers
+                buf, numbers = [], []
+        if buf or not numbers:
+            yield pd.DataFrame(buf, columns=header), numbers
+    finally:
+        wb.close()
+
+def _csv_chunks(stream, chunk_rows):
+    import pandas as pd
+    try:
+        reader = pd.read_csv(stream, chunksize=chunk_rows, dtype=str, keep_default_na=False, skip_blank_lines=False, encoding='utf-8-sig')
+    except pd.errors.EmptyDataError:
+        raise ImportFileError('The file has no header row')
+    for df in reader:
+        df.columns = [str(c).strip() for c in df.columns]
+        df = df.fillna('')
+        # data row i is line i + 2 (line 1 is the header)
+        df = df[(df != '').any(axis=1)]
+        yield df, [int(i) + 2 for i in df.index]
+
+def read_chunks(file_storage, chunk_rows=IMPORT_CHUNK_ROWS):
+    name = (file_storage.filename or '').lower()
+    if name.endswith('.csv'):
+        return _csv_chunks(file_storage.stream, chunk_rows)
+    if name.endswith(('.xlsx', '.xlsm')):
+        return _xlsx_chunks(file_storage.stream, chunk_rows)
+    raise ImportFileError('Unsupported file type (use .xlsx or .csv)')
+
+# --------- vectorized validation ----------
+def _as_text(col):
+    import pandas as pd
+    if pd.api.types.is_datetime64_any_dtype(col):
+        col = col.dt.strftime('%Y-%m-%d')
+    s = col.astype('string').str.strip()
+    # integral numbers read from Excel as floats (e.g. IDs) lose the ".0"
+    s = s.str.replace(r'^(-?\d+)\.0+$', r'\1', regex=True)
+    return s.mask(s == '')
+
+# returns (clean DataFrame with spec columns, reasons Series ('' = valid))
+def validate(df, spec):
+    import pandas as pd
+    lookup = {str(c).strip().lower(): c for c in df.columns}
+    clean = pd.DataFrame(index=df.index)
+    reasons = pd.Series('', index=df.index, dtype=object)
+
+    def reject(mask, msg):
+        mask = mask.fillna(False).astype(bool)
+        if mask.any():
+            reasons.loc[mask] = reasons.loc[mask] + msg + '; '
+
+    for col, (kind, required, rules) in spec['columns'].items():
+        src = lookup.get(col.lower())
+        raw = _as_text(df[src]) if src is not None else pd.Series(pd.NA, index=df.index, dtype='string')
+        if kind == 'int':
+            num = pd.to_numeric(raw, errors='coerce')
+            reject(raw.notna() & num.isna(), f'{col}: not a number')
+            reject(num.notna() & (num % 1 != 0), f'{col}: not an integer')
+            if 'min' in rules:
+                reject(num.notna() & (num < rules['min']), f"{col}: must be >= {rules['min']}")
+            value = num.round().astype('Int64')
+        elif kind == 'upper':
+            value = raw.str.upper()
+        else:
+            value = raw
+        if required:
+            reject(value.isna(), f'{col}: required')
+        clean[col] = value
+    return clean, reasons.str.rstrip('; ')
+
+def missing_columns(df, spec):
+    have = {str(c).strip().lower() for c in df.columns}
+    return [c for c, (_, required, _) in spec['columns'].items() if required and c.lower() not in have]
+
+# --------- loading ----------
+def _copy(cur, table, columns, frame):
+    buf = io.StringIO()
+    frame.to_csv(buf, index=False, header=False, na_rep='')
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+# → the on_conflict mode to use ('skip' when not given for a keyed
+# table, None for the append-only ones); raises ImportFileError
+def check_options(kind, on_conflict=None):
+    spec = SPECS.get(kind)
+    if spec is None:
+        raise ImportFileError(f'Unknown import type: {kind}')
+    if not spec['key']:
+        if on_conflict:
+            keyed = ', '.join(k for k, s in SPECS.items() if s['key'])
+            raise ImportFileError(f'on_conflict only applies to {keyed}; {kind} rows are always appended')
+        return None
+    on_conflict = on_conflict or 'skip'
+    if on_conflict not in ('skip', 'update'):
+        raise ImportFileError('on_conflict must be skip or update')
+    return on_conflict
+
+# run the whole pipeline inside the caller's transaction
+def import_file(cur, kind, file_storage, on_conflict=None, chunk_rows=IMPORT_CHUNK_ROWS, progress=None):
+    import pandas as pd
+    on_conflict = check_options(kind, on_conflict)
+    spec = SPECS[kind]
+    table, key = spec['table'], spec['key']
+    columns = list(spec['columns'])
+    staging = f'_import_{table}'
+    if key:
+        cur.execute(f'CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {", ".join(columns)}, 0 AS _src_row FROM {table} WITH NO DATA')
+
+    received = inserted = rejected = 0
+    rejections = []
+    checked_header = False
+    for df, numbers in read_chunks(file_storage, chunk_rows):
+        if not checked_header:
+            missing = missing_columns(df, spec)
+            if missing:
+                raise ImportFileError(f"Missing columns: {', '.join(missing)}")
+            checked_header = True
+        if df.empty:
+            continue
+        received += len(df)
+        if progress:
+            progress(received)
+        row_numbers = pd.Series(numbers, index=df.index)
+        clean, reasons = validate(df, spec)
+        bad = reasons != ''
+        if bad.any():
+            rejected += int(bad.sum())
+            room = IMPORT_MAX_REPORTED - len(rejections)
+            if room > 0:
+                rejections.extend({'row': int(row_numbers[i]), 'errors': reasons[i].split('; ')} for i in bad[bad].index[:room])
+        good = clean[~bad]
+        if good.empty:
+            continue
+        if key:
+            _copy(cur, staging, columns + ['_src_row'], good.assign(_src_row=row_numbers[~bad]))
+        else:
+            _copy(cur, table, columns, good)
+            inserted += len(good)
+
+    if not checked_header:
+        raise ImportFileError('The file has no header row')
+
+    skipped = 0
+    if key:
+        col_sql = ', '.join(columns)
+        # last occurrence of a key in the file wins
+        select = f'SELECT DISTINCT ON ({key}) {col_sql} FROM {staging} ORDER BY {key}, _src_row DESC'
+        if on_conflict == 'update':
+            updates = ', '.join(f'{c} = EXCLUDED.{c}' for c in columns if c != key)
+            cur.execute(f'INSERT INTO {table} ({col_sql}) {select} ON CONFLICT ({key}) DO UPDATE SET {updates}')
+        else:
+            cur.execute(f'INSERT INTO {table} ({col_sql}) {select} ON CONFLICT ({key}) DO NOTHING')
+        inserted = cur.rowcount
+        skipped = received - rejected - inserted
+
+    return {
+        'type': kind,
+        'table': table,
+        'received': received,
+        'inserted': inserted,
+        'rejected': rejected,
+        'skipped': skipped,
+        'rejections': rejections,
+        'rejections_truncated': rejected > len(rejections),
+    }
@@ -0,0 +1,212 @@
+# ===== FILE: api/jobs.py =====
+# Background jobs for long operations (whole-session seating, large
+# imports, multi-exam PDFs) so they do not run inside the HTTP request.
+#   submit(kind, params)      → job id (row in the jobs table)
+#   get(job_id) / cancel(job_id)
+# Each worker process runs JOB_WORKERS threads that claim queued jobs
+# with FOR UPDATE SKIP LOCKED, so any worker may pick up any job.
+# Running jobs send a heartbeat; a job whose heartbeat is older than
+# JOB_STALE_SECONDS (its worker died or restarted) is queued again, up
+# to JOB_MAX_ATTEMPTS, then marked failed. The uploaded payload is
+# dropped once a job reaches a terminal state.
+# Handlers are registered with @handler('kind') and receive a JobContext.
+import os
+import json
+import time
+import socket
+import threading
+import traceback
+import psycopg2.extras
+import db as dbmod
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '5'))
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', '10'))
+JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', '60'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RUNNER = os.getenv('JOB_RUNNER', '1') == '1'
+
+HANDLERS = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+class JobContext:
+    def __init__(self, job_id, kind, params, payload=None, payload_name=None):
+        self.id = job_id
+        self.kind = kind
+        self.params = params or {}
+        self.payload = payload
+        self.payload_name = payload_name
+
+    # store progress (0-100, or None to keep it) and check for cancellation
+    def progress(self, percent=None, message=None):
+        rows = dbmod.execute_returning("""
+            UPDATE jobs SET progress = COALESCE(%s, progress), message = COALESCE(%s, message), heartbeat_at = NOW()
+            WHERE id = %s RETURNING cancel_requested
+        """, (percent, message, self.id))
+        if rows and rows[0]['cancel_requested']:
+            raise JobCancelled()
+
+    def check_cancelled(self):
+        rows = dbmod.fetchall('SELECT cancel_requested FROM jobs WHERE id=%s', (self.id,))
+        if rows and rows[0]['cancel_requested']:
+            raise JobCancelled()
+
+# ---------------------------------------------------------
+# public API
+# ---------------------------------------------------------
+JOB_COLUMNS = 'id, kind, status, params, progress, message, result, error, cancel_requested, attempts, created_at, started_at, finished_at'
+
+def submit(kind, params=None, payload=None, payload_name=None):
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    with dbmod.get_cursor(True) as (conn, cur):
+        cur.execute('INSERT INTO jobs (kind, params, payload, payload_name) VALUES (%s, %s, %s, %s) RETURNING id',
+                    (kind, psycopg2.extras.Json(params or {}), psycopg2.Binary(payload) if payload is not None else None, payload_name))
+        job_id = cur.fetchone()['id']
+    ensure_started()
+    _wakeup.set()
+    return job_id
+
+def get(job_id):
+    rows = dbmod.fetchall(f'SELECT {JOB_COLUMNS} FROM jobs WHERE id=%s', (job_id,))
+    if not rows:
+        return None
+    job = dict(rows[0])
+    job['progress'] = float(job['progress'] or 0)
+    for k in ('created_at', 'started_at', 'finished_at'):
+        job[k] = job[k].isoformat() if job[k] else None
+    return job
+
+# queued jobs are cancelled at once, running ones at their next progress()
+def cancel(job_id):
+    with dbmod.get_cursor(True) as (conn, cur):
+        cur.execute("""
+            UPDATE jobs SET cancel_requested = TRUE,
+                   status = CASE WHEN status = 'queued' THEN 'cancelled' ELSE status END,
+                   finished_at = CASE WHEN status = 'queued' THEN NOW() ELSE finished_at END,
+                   payload = CASE WHEN status = 'queued' THEN NULL ELSE payload END
+            WHERE id = %s RETURNING status
+        """, (job_id,))
+        row = cur.fetchone()
+    return row['status'] if row else None
+
+# ---------------------------------------------------------
+# runner (threads started once per worker process)
+# ---------------------------------------------------------
+_wakeup = threading.Event()
+_running = set()
+_running_lock = threading.Lock()
+_started_pid = None
+_start_lock = threading.Lock()
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def ensure_started():
+    global _started_pid
+    if not JOB_RUNNER or JOB_WORKERS <= 0 or _started_pid == os.getpid():
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+        with _running_lock:
+            _running.clear()
+        for i in range(JOB_WORKERS):
+            threading.Thread(target=_work_loop, name=f'job-worker-{i}', daemon=True).start()
+        threading.Thread(target=_maintenance_loop, name='job-maintenance', daemon=True).start()
+
+def _claim():
+    with dbmod.get_cursor(True) as (conn, cur):
+        cur.execute("""
+            UPDATE jobs SET status = 'running', worker = %s, attempts = attempts + 1,
+                   started_at = NOW(), heartbeat_at = NOW()
+            WHERE id = (
+                SELECT id FROM jobs WHERE status = 'queued' AND NOT cancel_requested
+                ORDER BY id FOR UPDATE SKIP LOCKED LIMIT 1
+            )
+            RETURNING id, kind, params, payload, payload_name
+        """, (worker_name(),))
+        return cur.fetchone()
+
+def _finish(job_id, status, result=None, error=None):
+    dbmod.execute("""
+        UPDATE jobs SET status = %s, result = %s, error = %s, finished_at = NOW(), payload = NULL,
+               progress = CASE WHEN %s = 'succeeded' THEN 100 ELSE progress END
+        WHERE id = %s
+    """, (status, psycopg2.extras.Json(result) if result is not None else None, error, status, job_id))
+
+def run_one():
+    row = _claim()
+    if row is None:
+        return False
+    job_id = row['id']
+    with _running_lock:
+        _running.add(job_id)
+    try:
+        payload = bytes(row['payload']) if row['payload'] is not None else None
+        ctx = JobContext(job_id, row['kind'], row['params'], payload, row['payload_name'])
+        fn = HANDLERS.get(row['kind'])
+        if fn is None:
+            _finish(job_id, 'failed', error=f"No handler for job kind {row['kind']}")
+            return True
+        try:
+            result = fn(ctx)
+            _finish(job_id, 'succeeded', result=json.loads(json.dumps(result, default=str)))
+        except JobCancelled:
+            _finish(job_id, 'cancelled')
+        except Exception as e:
+            traceback.print_exc()
+            _finish(job_id, 'failed', error=str(e))
+    finally:
+        with _running_lock:
+            _running.discard(job_id)
+    return True
+
+def _work_loop():
+    while True:
+        try:
+            if run_one():
+                continue
+        except Exception:
+            traceback.print_exc()
+        _wakeup.wait(JOB_POLL_SECONDS)
+        _wakeup.clear()
+
+def _maintenance_loop():
+    while True:
+        try:
+            with _running_lock:
+                ids = list(_running)
+            if ids:
+                dbmod.execute('UPDATE jobs SET heartbeat_at = NOW() WHERE id = ANY(%s)', (ids,))
+            recover_stale()
+        except Exception:
+            traceback.print_exc()
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+
+# re-queue jobs whose worker stopped sending heartbeats
+def recover_stale():
+    rows = dbmod.execute_returning("""
+        UPDATE jobs SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'queued' END,
+               error = CASE WHEN attempts >= %s THEN 'Interrupted too many times' ELSE error END,
+               finished_at = CASE WHEN attempts >= %s THEN NOW() ELSE finished_at END,
+               payload = CASE WHEN attempts >= %s THEN NULL ELSE payload END,
+               worker = NULL
+        WHERE status = 'running' AND heartbeat_at < NOW() - make_interval(secs => %s)
+        RETURNING id, status
+    """, (JOB_MAX_ATTEMPTS, JOB_MAX_ATTEMPTS, JOB_MAX_ATTEMPTS, JOB_MAX_ATTEMPTS, JOB_STALE_SECONDS))
+    if any(r['status'] == 'queued' for r in rows):
+        _wakeup.set()
+    return rows
@@ -0,0 +1,168 @@
+# ===== FILE: api/pdf.py =====
+# Seating PDF rendering: reportlab layout runs in a process pool and
+# finished PDFs are cached on disk. The cache key is a fingerprint of
+# the exams' student_legan rows, so any assign / reassign / unassign
+# produces a new key; invalidate() additionally drops the stale files
+# and prune() keeps the directory under PDF_CACHE_MAX_BYTES /
+# PDF_CACHE_MAX_AGE_HOURS (least recently served files go first).
+import os
+import json
+import time
+import glob
+import hashlib
+import threading
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(os.getenv('UPLOAD_FOLDER', 'uploads'), 'pdf_cache'))
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', '2'))
+PDF_RENDER_TIMEOUT = float(os.getenv('PDF_RENDER_TIMEOUT', '120'))
+PDF_MP_CONTEXT = os.getenv('PDF_MP_CONTEXT', 'spawn')
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+PDF_CACHE_MAX_AGE_HOURS = float(os.getenv('PDF_CACHE_MAX_AGE_HOURS', '168'))
+# bump when the layout changes so old cached files are not served
+RENDER_VERSION = '1'
+
+FINGERPRINT_SQL = """
+SELECT e.Exam_id AS exam_id,
+       md5(COALESCE(string_agg(sl.student_legan_id || ':' || sl.legan_id || ':' || sl.student_id, ',' ORDER BY sl.student_legan_id), '')) AS digest
+FROM exam e
+LEFT JOIN student_legan sl ON sl.exam = e.Exam_id
+WHERE e.Exam_id = ANY(%s)
+GROUP BY e.Exam_id
+"""
+
+# --------- rendering (runs in the worker processes) ----------
+def render_pdf(legans):
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+
+    pdf_buffer = BytesIO()
+    p = canvas.Canvas(pdf_buffer, pagesize=A4)
+    width, height = A4
+    for data in legans:
+        p.setFont('Helvetica-Bold', 14)
+        p.drawString(40, height-50, f"Legen: {data['legan_name']}")
+        p.setFont('Helvetica', 10)
+        p.drawString(40, height-66, f"{data.get('course') or ''}  {data.get('day') or ''} {data.get('period_id') or ''}  {data.get('room_name') or ''}")
+        y = height-90
+        p.setFont('Helvetica', 11)
+        for s in data['students']:
+            p.drawString(50, y, f"{s['student_id']} - {s['student_name']}")
+            y -= 16
+            if y < 80:
+                p.showPage()
+                p.setFont('Helvetica', 11)
+                y = height-80
+        p.showPage()
+    p.save()
+    return pdf_buffer.getvalue()
+
+# --------- process pool (one per worker process) ----------
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context(PDF_MP_CONTEXT))
+                _executor_pid = pid
+    return _executor
+
+def render_in_pool(legans):
+    if PDF_WORKERS <= 0:
+        return render_pdf(legans)
+    return get_executor().submit(render_pdf, legans).result(timeout=PDF_RENDER_TIMEOUT)
+
+# --------- cache ----------
+def fingerprint(cur, exam_ids):
+    cur.execute(FINGERPRINT_SQL, (list(exam_ids),))
+    parts = sorted((r['exam_id'], r['digest']) for r in cur.fetchall())
+    raw = json.dumps([RENDER_VERSION, parts])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def cache_path(key):
+    return os.path.join(PDF_CACHE_DIR, f'{key}.pdf')
+
+def _write_atomic(path, data, mode='wb'):
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, mode) as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+# → (key, path of the cached PDF or None); a hit is marked as recently
+# served so prune() keeps it
+def lookup(cur, exam_ids):
+    key = fingerprint(cur, exam_ids)
+    path = cache_path(key)
+    try:
+        os.utime(path)
+        return key, path
+    except OSError:
+        return key, None
+
+# render the legans (no DB connection needed) and cache them under key → path
+def render_and_store(key, exam_ids, legans):
+    data = render_in_pool(legans)
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    path = cache_path(key)
+    _write_atomic(f'{os.path.join(PDF_CACHE_DIR, key)}.json', json.dumps({'exam_ids': sorted(set(exam_ids))}), 'w')
+    _write_atomic(path, data)
+    prune(keep=path)
+    return path
+
+def _remove_entry(pdf_path):
+    for path in (pdf_path, pdf_path[:-len('.pdf')] + '.json'):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# drop PDFs not served for max_age_hours, then the least recently served
+# ones until the directory fits in max_bytes → files removed
+def prune(max_bytes=PDF_CACHE_MAX_BYTES, max_age_hours=PDF_CACHE_MAX_AGE_HOURS, keep=None):
+    if not os.path.isdir(PDF_CACHE_DIR):
+        return 0
+    entries = []
+    for path in glob.glob(os.path.join(PDF_CACHE_DIR, '*.pdf')):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()
+    cutoff = time.time() - max_age_hours * 3600 if max_age_hours > 0 else None
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        if path == keep:
+            continue
+        expired = cutoff is not None and mtime < cutoff
+        if not expired and (max_bytes <= 0 or total <= max_bytes):
+            continue
+        _remove_entry(path)
+        total -= size
+        removed += 1
+    return removed
+
+# drop every cached PDF that contains one of the exams
+def invalidate(exam_ids):
+    exam_ids = {int(e) for e in exam_ids}
+    if not exam_ids or not os.path.isdir(PDF_CACHE_DIR):
+        return 0
+    removed = 0
+    for meta in glob.glob(os.path.join(PDF_CACHE_DIR, '*.json')):
+        try:
+            with open(meta, encoding='utf-8') as fh:
+                cached_ids = set(json.load(fh).get('exam_ids', []))
+        except (OSError, ValueError):
+            continue
+        if cached_ids & exam_ids:
+            _remove_entry(meta[:-len('.json')] + '.pdf')
+            removed += 1
+    return removed
@@ -0,0 +1,135 @@
+# ===== FILE: api/planner.py =====
+# Packing planner for one day/period slot (strategy=pack).
+# The default planner (seating.plan_slot) fills each exam's legans in
+# Legan_id order; this one looks at all exams of the slot together and
+# uses as few rooms as it can:
+#   - exams that share a legan pool (same program/level) are seated as
+#     one block, optionally alternating their courses seat by seat
+#   - rooms already used in the slot come first, then the rooms with the
+#     most free seats, so the fewest rooms cover the demand
+#     (per-room free seats via bincount, cut-off via cumsum/searchsorted)
+# Returns the same (placements, summaries) as seating.plan_slot, so the
+# plan is written with seating.write_placements.
+import numpy as np
+
+
+def legan_key(exam):
+    return (str(exam['program']).upper(), str(exam['level']))
+
+def course_key(exam):
+    return (str(exam['program']).upper(), str(exam['code_course']))
+
+def new_summary(exam, total):
+    return {'exam_id': exam['exam_id'], 'code_course': exam['code_course'], 'program': exam['program'],
+            'level': exam['level'], 'day': exam['day'], 'period_id': exam['period_id'],
+            'date': str(exam['date']) if exam['date'] else None, 'total': total, 'assigned': 0}
+
+
+class SlotState:
+    """Free seats of every legan usable in one slot, as arrays."""
+
+    def __init__(self, legans, occupied):
+        self.legans = legans
+        self.index = {leg['legan_id']: i for i, leg in enumerate(legans)}
+        self.legan_ids = np.array([leg['legan_id'] for leg in legans], dtype=np.int64)
+        self.capacity = np.array([int(leg.get('capacity') or 0) for leg in legans], dtype=np.int64)
+        used = np.array([occupied.get(leg['legan_id'], 0) for leg in legans], dtype=np.int64)
+        self.free = np.maximum(self.capacity - used, 0)
+        # dense room codes; a legan without a room counts as its own room
+        codes = {}
+        self.room = np.array([codes.setdefault(leg['room_id'] if leg.get('room_id') is not None else ('legan', leg['legan_id']), len(codes))
+                              for leg in legans], dtype=np.int64)
+        self.opened = np.zeros(len(codes), dtype=bool)
+        self.opened[self.room[used > 0]] = True
+
+    # fewest rooms (then legans) covering demand among the eligible legans
+    # → (legan positions, seats taken in each)
+    def choose(self, eligible, demand):
+        f = self.free[eligible]
+        r = self.room[eligible]
+        room_free = np.bincount(r, weights=f, minlength=len(self.opened))
+        # lexsort: last key is the primary one
+        order = np.lexsort((-f, r, -room_free[r], ~self.opened[r]))
+        order = order[f[order] > 0]
+        if order.size == 0 or demand <= 0:
+            return eligible[:0], f[:0]
+        seats = np.cumsum(f[order])
+        k = min(int(np.searchsorted(seats, demand)) + 1, order.size)
+        take = f[order[:k]].copy()
+        take[-1] -= max(int(seats[k - 1]) - demand, 0)
+        return eligible[order[:k]], take
+
+    def commit(self, picked, take):
+        self.free[picked] -= take
+        self.opened[self.room[picked[take > 0]]] = True
+
+
+def pack_slot(exams, legans_by_key, students_by_key, occupied, alternate=False):
+    pool, seen = [], set()
+    for exam in exams:
+        for leg in legans_by_key.get(legan_key(exam), []):
+            if leg['legan_id'] not in seen:
+                seen.add(leg['legan_id'])
+                pool.append(leg)
+    state = SlotState(pool, occupied)
+
+    groups = {}
+    for exam in exams:
+        groups.setdefault(legan_key(exam), []).append(exam)
+    # the biggest demand picks rooms first
+    ordered = sorted(groups.items(), key=lambda kv: -sum(len(students_by_key.get(course_key(e), [])) for e in kv[1]))
+
+    placements, summaries = [], {}
+    for key, group in ordered:
+        students = [students_by_key.get(course_key(e), []) for e in group]
+        eligible = np.array([state.index[leg['legan_id']] for leg in legans_by_key.get(key, [])], dtype=np.int64)
+        for exam, regs in zip(group, students):
+            summaries[exam['exam_id']] = new_summary(exam, len(regs))
+            if eligible.size == 0:
+                summaries[exam['exam_id']]['error'] = 'No legans available for this program/level'
+            elif not regs:
+                summaries[exam['exam_id']]['error'] = 'No registered students for this course'
+        counts = np.array([len(regs) for regs in students], dtype=np.int64)
+        total = int(counts.sum())
+        if eligible.size == 0 or total == 0:
+            continue
+
+        picked, take = state.choose(eligible, total)
+        seated = int(take.sum())
+        # seat order: exam blocks one after another, or round-robin over
+        # the exams of the group when alternating
+        exam_of = np.repeat(np.arange(len(group)), counts)
+        if alternate and len(group) > 1:
+            rank = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            seq = np.lexsort((exam_of, rank))[:seated]
+        else:
+            seq = np.arange(seated)
+        seat_legan = np.repeat(picked, take)
+        state.commit(picked, take)
+
+        student_ids = np.array([s['student_id'] for regs in students for s in regs], dtype=object)
+        exam_ids = np.array([e['exam_id'] for e in group], dtype=np.int64)
+        placements.extend(zip(state.legan_ids[seat_legan].tolist(), student_ids[seq].tolist(), exam_ids[exam_of[seq]].tolist()))
+
+        # per (exam, legan) seat counts for the summaries
+        pair, added = np.unique(exam_of[seq] * len(pool) + seat_legan, return_counts=True)
+        for p, n in zip(pair.tolist(), added.tolist()):
+            exam, pos = group[p // len(pool)], p % len(pool)
+            leg = pool[pos]
+            s = summaries[exam['exam_id']]
+            s['assigned'] += n
+            s.setdefault('legans', []).append({
+                'legan_id': leg['legan_id'],
+                'legan_name': leg['legan_name'],
+                'room_id': leg.get('room_id'),
+                'capacity': int(state.capacity[pos]),
+                'filled': int(state.capacity[pos] - state.free[pos]),
+                'added': n,
+            })
+
+    out = []
+    for exam in exams:
+        s = summaries[exam['exam_id']]
+        s['unseated'] = s['total'] - s['assigned']
+        out.append(s)
+    return placements, out
@@ -1,50 +1,129 @@
 
 # ===== FILE: api/routes.py =====
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, send_file
+from werkzeug.datastructures import FileStorage
+from urllib.parse import urlencode
 from io import BytesIO
 import os
-import pandas as pd
-from werkzeug.utils import secure_filename
+import json
+import base64
 import traceback
+from datetime import datetime
 import db as dbmod
+import metrics
+from . import seating, pdf, cache, importer, jobs, conflicts, history, seat_index
+from .idempotency import idempotent
 
 api_routes = Blueprint('api_routes', __name__)
-UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# Day ordering as CASE
-DAY_ORDER_CASE = "CASE e.day WHEN 'Saturday' THEN 1 WHEN 'Sunday' THEN 2 WHEN 'Monday' THEN 3 WHEN 'Tuesday' THEN 4 WHEN 'Wednesday' THEN 5 WHEN 'Thursday' THEN 6 WHEN 'Friday' THEN 7 END"
-
-PERIOD_MINUTES_SQL_PG = """
-(
-    (
-        CASE
-            WHEN CAST(split_part(split_part(e.period_id, '-', 1), ':', 1) AS INTEGER) BETWEEN 1 AND 7
-                THEN CAST(split_part(split_part(e.period_id, '-', 1), ':', 1) AS INTEGER) + 12
-            ELSE CAST(split_part(split_part(e.period_id, '-', 1), ':', 1) AS INTEGER)
-        END
-    ) * 60
-    +
-    CAST(split_part(split_part(e.period_id, '-', 1), ':', 2) AS INTEGER)
-)
-"""
+
+# Exam sort key: stored day_order / period_start_minutes columns
+# (migrations/0002_exam_sort_keys.sql), covered by exam_sort_idx
+EXAM_ORDER_SQL = "e.day_order, e.period_start_minutes, e.Exam_id"
 
 # --------- helper to build filters ----------
-def build_filters(prefix='e'):
+def build_filters(prefix='e', args=None):
+    args = request.args if args is None else args
     where, params = [], []
     def add(col, qp):
-        v = request.args.get(qp)
+        v = args.get(qp)
         if v:
             where.append(f"{prefix}.{col} = %s")
             params.append(v)
     for col, qp in [('program','program'),('level','level'),('code_course','code_course'),('day','day'),('type','type'),('period_id','period_id'),('date','date')]:
         add(col, qp)
-    ex = request.args.get('exam_id')
+    ex = args.get('exam_id')
     if ex:
         where.append(f"{prefix}.Exam_id = %s")
         params.append(ex)
     return (f"WHERE {' AND '.join(where)}" if where else ''), params
 
+# query-string filters, overridden by a JSON body when one is sent
+def request_filter_args():
+    args = request.args.to_dict()
+    body = request.get_json(silent=True) if request.is_json else None
+    if isinstance(body, dict):
+        args.update({k: str(v) for k, v in body.items() if v not in (None, '')})
+    return args
+
+def and_where(where_sql, clause):
+    return f"{where_sql} AND {clause}" if where_sql else f"WHERE {clause}"
+
+# called after a transaction that changed the seating of these exams
+def after_seating_change(exam_ids):
+    exam_ids = list(exam_ids)
+    if not exam_ids:
+        return
+    cache.invalidate('students-legans', exam_ids)
+    try:
+        pdf.invalidate(exam_ids)
+    except Exception:
+        traceback.print_exc()
+    # student_seat_index was kept in step by triggers in the same
+    # transaction; a student's cached entry does not list the exams they
+    # were just added to, so the whole namespace goes
+    cache.invalidate('student-seats', store=seat_index.seat_cache)
+
+# --------- keyset pagination / projection ----------
+MAX_PAGE_LIMIT = int(os.getenv('MAX_PAGE_LIMIT', '500'))
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode('utf-8')).decode('ascii').rstrip('=')
+
+# types: the expected type of each keyset value, e.g. (str, int)
+def decode_cursor(raw, types):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError('Invalid cursor')
+    # bool is an int subclass; true / false are never valid keys
+    if any(isinstance(v, bool) or not isinstance(v, t) for v, t in zip(values, types)):
+        raise ValueError('Invalid cursor')
+    return values
+
+# ?limit=&cursor=&fields= → {'limit', 'cursor', 'fields'}; raises ValueError.
+# cursor_types: type of each keyset value, e.g. (str, int)
+def page_args(allowed_fields, cursor_types):
+    limit = request.args.get('limit')
+    if limit:
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_LIMIT:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_LIMIT}')
+        limit = int(limit)
+    else:
+        limit = None
+    cursor = request.args.get('cursor')
+    if cursor and not limit:
+        raise ValueError('cursor requires limit')
+    fields = list(allowed_fields)
+    if request.args.get('fields'):
+        wanted = {f.strip().lower() for f in request.args['fields'].split(',') if f.strip()}
+        unknown = wanted - {f.lower() for f in allowed_fields}
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        # the id column is always returned (and used for the keyset)
+        fields = [f for i, f in enumerate(allowed_fields) if i == 0 or f.lower() in wanted]
+    return {'limit': limit, 'cursor': decode_cursor(cursor, cursor_types) if cursor else None, 'fields': fields}
+
+# rows fetched with LIMIT limit+1 → page dict with next_cursor
+def paginate(rows, limit, key_cols, total):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor([rows[-1][k] for k in key_cols]) if has_more and rows else None
+    items = [{k: v for k, v in row.items() if not k.startswith('_k_')} for row in rows]
+    return {'items': items, 'next_cursor': next_cursor, 'total': total, 'limit': limit}
+
+# truthy query-string / JSON body flag, e.g. ?dry_run=1
+def request_flag(name):
+    v = request.args.get(name)
+    if v is None and request.is_json:
+        body = request.get_json(silent=True)
+        v = body.get(name) if isinstance(body, dict) else None
+    return truthy(v)
+
+def truthy(v):
+    return str(v).strip().lower() in ('1', 'true', 'yes', 'on')
+
 # ============ simple endpoints (rooms) ==========
 @api_routes.route('/api/hello')
 def hello():
@@ -53,13 +132,35 @@ def hello():
 @api_routes.route('/api/v1/rooms', methods=['GET'])
 def get_all_rooms():
     try:
-        rows = dbmod.fetchall('SELECT room_id, room_name, capacity, floor FROM rooms ORDER BY floor ASC')
-        return jsonify(rows), 200
+        page = page_args(ROOM_FIELDS, (str, int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return cache.cached_json('rooms', lambda: (load_rooms(page), None))
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+ROOM_FIELDS = ['room_id', 'room_name', 'capacity', 'floor']
+
+# both paths walk (COALESCE(floor, ''), room_id), rooms_floor_keyset_idx
+def load_rooms(page):
+    cols = ', '.join(f'r.{f}' for f in page['fields'])
+    if not page['limit']:
+        return dbmod.fetchall(f"SELECT {cols} FROM rooms r ORDER BY COALESCE(r.floor, ''), r.room_id")
+    where_sql, params = '', []
+    if page['cursor']:
+        where_sql = "WHERE (COALESCE(r.floor, ''), r.room_id) > (%s, %s)"
+        params = list(page['cursor'])
+    rows = dbmod.fetchall(f"""
+        SELECT {cols}, COALESCE(r.floor, '') AS _k_floor, r.room_id AS _k_id FROM rooms r {where_sql}
+        ORDER BY COALESCE(r.floor, ''), r.room_id LIMIT %s
+    """, params + [page['limit'] + 1])
+    total = dbmod.fetchall('SELECT COUNT(*) AS n FROM rooms')[0]['n']
+    return paginate(rows, page['limit'], ('_k_floor', '_k_id'), total)
+
 @api_routes.route('/api/v1/rooms', methods=['POST'])
+@idempotent
 def add_room():
     try:
         data = request.get_json(force=True)
@@ -67,374 +168,752 @@ def add_room():
         if any(data.get(k) in (None,'') for k in required):
             return jsonify({'error':'Missing fields'}), 400
         dbmod.execute('INSERT INTO rooms (room_name, capacity, floor) VALUES (%s,%s,%s)', (data['room_name'], data['capacity'], data['floor']))
+        cache.invalidate('rooms')
         return jsonify({'message':'✅ Room added successfully!'}), 201
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
 @api_routes.route('/api/v1/rooms/upload', methods=['POST'])
+@idempotent
 def upload_room_file():
+    response, status = run_import('rooms')
+    data = response.get_json()
+    if status == 201:
+        data['message'] = f"Successfully uploaded {data['inserted']} rooms!"
+    elif status == 200:
+        data['message'] = 'No valid room records found'
+    return jsonify(data), status
+
+# ============ bulk import (xlsx / csv) ==========
+# /api/v1/import/rooms|students|registration|exams|legans
+# ?on_conflict=skip|update for the keyed tables (exams, legans); the
+# other types are append-only and refuse it
+@api_routes.route('/api/v1/import/<kind>', methods=['POST'])
+@idempotent
+def import_master_data(kind):
+    return run_import(kind)
+
+IMPORT_INVALIDATES = {'rooms': 'rooms', 'exams': 'students-legans', 'legans': 'students-legans'}
+
+def run_import(kind):
+    if kind not in importer.SPECS:
+        return jsonify({'error': f'Unknown import type: {kind}'}), 404
     if 'file' not in request.files:
         return jsonify({'error':'No file part'}), 400
     file = request.files['file']
     if file.filename == '':
         return jsonify({'error':'No file selected'}), 400
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
+    on_conflict = request.args.get('on_conflict')
     try:
-        file.save(filepath)
-        df = pd.read_excel(filepath)
-        required = {'room_name','capacity','floor'}
-        if not required.issubset(df.columns):
-            missing = required - set(df.columns)
-            return jsonify({'error': f'Missing columns: {', '.join(missing)}'}), 400
-        batch = []
-        for _, row in df.iterrows():
-            try:
-                capacity = int(row.get('capacity',0))
-            except Exception:
-                continue
-            room_name = str(row.get('room_name','')).strip()
-            floor = str(row.get('floor','')).strip()
-            if not room_name or capacity <= 0:
-                continue
-            batch.append((room_name, capacity, floor))
-        if batch:
-            with dbmod.get_cursor(False) as (conn, cur):
-                cur.executemany('INSERT INTO rooms (room_name, capacity, floor) VALUES (%s,%s,%s)', batch)
-                conn.commit()
-            return jsonify({'message': f'Successfully uploaded {len(batch)} rooms!'}), 201
-        return jsonify({'message':'No valid room records found'}), 200
+        # refused here so a bad option is a 400, not a failed job
+        on_conflict = importer.check_options(kind, on_conflict)
+        if request_flag('async'):
+            return submit_job('import', {'kind': kind, 'on_conflict': on_conflict}, payload=file.read(), payload_name=file.filename)
+        result = do_import(kind, file, on_conflict)
+        return jsonify(result), (201 if result['inserted'] else 200)
+    except importer.ImportFileError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
-    finally:
-        try:
-            if os.path.exists(filepath): os.remove(filepath)
-        except Exception:
-            pass
+
+def do_import(kind, file_storage, on_conflict=None, progress=None):
+    with dbmod.get_cursor(True) as (conn, cur):
+        result = importer.import_file(cur, kind, file_storage, on_conflict=on_conflict, progress=progress)
+        reindex = kind in ('exams', 'legans') and on_conflict == 'update' and result['inserted']
+        if reindex:
+            # updated exam / legan details are copied into the seat index
+            seat_index.rebuild(cur)
+    if kind in IMPORT_INVALIDATES and result['inserted']:
+        cache.invalidate(IMPORT_INVALIDATES[kind])
+    if reindex:
+        cache.invalidate('student-seats', store=seat_index.seat_cache)
+    result['message'] = f"Imported {result['inserted']}/{result['received']} rows ({result['rejected']} rejected, {result['skipped']} skipped)."
+    return result
 
 # ============ students-legans grouped ==========
 @api_routes.route('/api/v1/students-legans', methods=['GET'])
 def get_all_students_legans():
     try:
-        where_sql, params = build_filters('e')
-        sql = f"""
-        SELECT e.Exam_id, e.year, e.semester, e.type, e.program, e.code_course,
-               e.date, e.day, e.level, e.period_id, e.assigned,
-               l.Legan_id AS legan_id, l.legan_name, l.capacity AS legan_capacity, r.room_name
+        page = page_args(EXAM_FIELDS, (int, int, int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return cache.cached_json('students-legans', lambda: load_students_legans(page))
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+EXAM_FIELDS = ['Exam_id', 'year', 'semester', 'type', 'program', 'code_course', 'date', 'day', 'level', 'period_id', 'assigned', 'legans']
+
+# grouped exams with their legans → (payload, exam ids) for the cache;
+# with a limit only one keyset page of exams is read and grouped
+def load_students_legans(page):
+    where_sql, params = build_filters('e')
+    count_where, count_params = where_sql, list(params)
+    if page['cursor']:
+        where_sql = and_where(where_sql, '(e.day_order, e.period_start_minutes, e.Exam_id) > (%s, %s, %s)')
+        params += list(page['cursor'])
+    fields = page['fields']
+    exam_cols = ', '.join(f'e.{f}' for f in fields if f != 'legans')
+    limit_sql = ''
+    if page['limit']:
+        limit_sql = 'LIMIT %s'
+        params.append(page['limit'] + 1)
+    sql = f"""
+    WITH page AS (
+        SELECT {exam_cols}, e.day_order AS _k_day, e.period_start_minutes AS _k_period, e.Exam_id AS _k_id
         FROM exam e
-        LEFT JOIN student_legan sl ON sl."Exam_id" = e.Exam_id
-        LEFT JOIN legan l ON l.Legan_id = sl.legan_id
-        LEFT JOIN rooms r ON r.room_id = l.room_id
         {where_sql}
-        ORDER BY {DAY_ORDER_CASE}, {PERIOD_MINUTES_SQL_PG}, e.Exam_id
-        """
-        print("\n========== SQL DEBUG ==========")
-        print(sql)
-        print("PARAMS:", params)
-        print("================================\n")
-        rows = dbmod.fetchall(sql, params)
-        print("ROWS:", rows)
-        grouped = {}
+        ORDER BY {EXAM_ORDER_SQL}
+        {limit_sql}
+    )
+    """
+    if 'legans' in fields:
+        sql += """
+    SELECT page.*, l.Legan_id AS legan_id, l.legan_name, l.capacity AS legan_capacity, r.room_name
+    FROM page
+    LEFT JOIN legan_occupancy sl ON sl.exam = page._k_id
+    LEFT JOIN legan l ON l.Legan_id = sl.legan_id
+    LEFT JOIN rooms r ON r.room_id = l.room_id
+    ORDER BY page._k_day, page._k_period, page._k_id, l.Legan_id
+    """
+    else:
+        sql += "SELECT * FROM page ORDER BY _k_day, _k_period, _k_id"
+    rows = dbmod.fetchall(sql, params)
+    grouped = {}
+    for row in rows:
+        eid = row['_k_id']
+        if eid not in grouped:
+            exam = {'Exam_id': eid}
+            for f in fields:
+                if f in ('Exam_id', 'legans'):
+                    continue
+                v = row[f.lower()]
+                if f == 'date':
+                    v = str(v) if v else None
+                elif f == 'assigned':
+                    v = int(v or 0)
+                exam[f] = v
+            if 'legans' in fields:
+                exam['legans'] = []
+            exam['_key'] = (row['_k_day'], row['_k_period'], eid)
+            grouped[eid] = exam
+        if row.get('legan_id'):
+            grouped[eid]['legans'].append({
+                'legan_id': row['legan_id'],
+                'legan_name': row['legan_name'],
+                'room_name': row['room_name'],
+                'capacity': row['legan_capacity']
+            })
+    exams = list(grouped.values())
+    if not page['limit']:
+        for exam in exams:
+            exam.pop('_key')
+        return exams, list(grouped.keys())
+    has_more = len(exams) > page['limit']
+    exams = exams[:page['limit']]
+    next_cursor = encode_cursor(exams[-1]['_key']) if has_more and exams else None
+    for exam in exams:
+        exam.pop('_key')
+    total = dbmod.fetchall(f'SELECT COUNT(*) AS n FROM exam e {count_where}', count_params)[0]['n']
+    return {'items': exams, 'next_cursor': next_cursor, 'total': total, 'limit': page['limit']}, [e['Exam_id'] for e in exams]
+
+# ============ conflicts endpoint ===========
+# students registered for more than one exam in the same day/period slot,
+# for the whole timetable or the exams matching the build_filters filters
+@api_routes.route('/api/v1/conflicts', methods=['GET'])
+def get_conflicts():
+    try:
+        where_sql, params = build_filters('e')
+        with dbmod.get_cursor(False) as (conn, cur):
+            clashes = conflicts.find_conflicts(cur, where_sql, params)
+        return jsonify({
+            'count': len(clashes),
+            'students': len({c['student_id'] for c in clashes}),
+            'exams': conflicts.summarize(clashes),
+            'conflicts': clashes,
+        }), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# ============ occupancy endpoint ===========
+# used / free seats per (exam, legan) from the trigger-maintained
+# legan_occupancy table; build_filters filters plus legan_id / room_id.
+# used is the exam's own seats, slot_used those of every exam in the same
+# day/period (exams of a slot may share a legan); free = capacity - slot_used.
+# ?include_empty=1 also lists the exam's eligible legans with no seats used
+OCCUPANCY_SQL = """
+    SELECT e.Exam_id, e.program, e.level, e.code_course, e.day, e.period_id, e.date,
+           l.Legan_id AS legan_id, l.legan_name, l.capacity, l.room_id, r.room_name,
+           COALESCE(o.used, 0) AS used, COALESCE(s.used, 0) AS slot_used, o.updated_at
+    FROM exam e
+    {join_sql}
+    LEFT JOIN rooms r ON r.room_id = l.room_id
+    LEFT JOIN LATERAL (
+        SELECT SUM(o2.used) AS used
+        FROM legan_occupancy o2
+        JOIN exam e2 ON e2.Exam_id = o2.exam
+        WHERE o2.legan_id = l.Legan_id AND e2.day IS NOT DISTINCT FROM e.day
+          AND e2.period_id IS NOT DISTINCT FROM e.period_id AND e2.date IS NOT DISTINCT FROM e.date
+    ) s ON TRUE
+    {where_sql}
+    ORDER BY {order_sql}, l.Legan_id
+"""
+
+@api_routes.route('/api/v1/occupancy', methods=['GET'])
+def get_occupancy():
+    try:
+        where_sql, params = build_filters('e')
+        for col, qp in (('l.Legan_id', 'legan_id'), ('l.room_id', 'room_id')):
+            if request.args.get(qp):
+                where_sql = and_where(where_sql, f'{col} = %s')
+                params.append(request.args[qp])
+        if request_flag('include_empty'):
+            join_sql = ('JOIN legan l ON l.program = UPPER(e.program) AND l.level = e.level '
+                        'LEFT JOIN legan_occupancy o ON o.exam = e.Exam_id AND o.legan_id = l.Legan_id')
+        else:
+            join_sql = 'JOIN legan_occupancy o ON o.exam = e.Exam_id JOIN legan l ON l.Legan_id = o.legan_id'
+        rows = dbmod.fetchall(OCCUPANCY_SQL.format(join_sql=join_sql, where_sql=where_sql, order_sql=EXAM_ORDER_SQL), params)
+        items = []
         for row in rows:
-            eid = row['exam_id']
-            if eid not in grouped:
-                grouped[eid] = {
-                    'Exam_id': eid,
-                    'year': row['year'],
-                    'semester': row['semester'],
-                    'type': row['type'],
-                    'program': row['program'],
-                    'code_course': row['code_course'],
-                    'date': str(row['date']) if row['date'] else None,
-                    'day': row['day'],
-                    'level': row['level'],
-                    'period_id': row['period_id'],
-                    'assigned': int(row.get('assigned') or 0),
-                    'legans': []
-                }
-            if row.get('legan_id'):
-                grouped[eid]['legans'].append({
-                    'legan_id': row['legan_id'],
-                    'legan_name': row['legan_name'],
-                    'room_name': row['room_name'],
-                    'capacity': row['legan_capacity']
-                })
-        return jsonify(list(grouped.values())), 200
+            capacity = int(row['capacity'] or 0)
+            items.append({
+                'exam_id': row['exam_id'],
+                'program': row['program'],
+                'level': row['level'],
+                'code_course': row['code_course'],
+                'day': row['day'],
+                'period_id': row['period_id'],
+                'date': str(row['date']) if row['date'] else None,
+                'legan_id': row['legan_id'],
+                'legan_name': row['legan_name'],
+                'room_id': row['room_id'],
+                'room_name': row['room_name'],
+                'capacity': capacity,
+                'used': row['used'],
+                'slot_used': int(row['slot_used']),
+                'free': max(capacity - int(row['slot_used']), 0),
+                'updated_at': row['updated_at'].isoformat() if row['updated_at'] else None,
+            })
+        # a legan shared by several exams of a slot counts once in the totals
+        slots = {(i['day'], i['period_id'], i['date'], i['legan_id']): i for i in items}
+        return jsonify({'count': len(items), 'used': sum(i['used'] for i in items),
+                        'capacity': sum(i['capacity'] for i in slots.values()),
+                        'free': sum(i['free'] for i in slots.values()), 'items': items}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# ============ history endpoint ===========
+# seat changes, newest first: ?student_id= / exam_id= / action= / since= / until=,
+# paginated with ?limit= (default 100) and the returned next_cursor
+@api_routes.route('/api/v1/history', methods=['GET'])
+def get_history():
+    try:
+        limit = request.args.get('limit', '100')
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_LIMIT:
+            return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_LIMIT}'}), 400
+        try:
+            filters, cursor = history_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        with dbmod.get_cursor(False) as (conn, cur):
+            items, next_cursor = history.page(cur, filters, int(limit), cursor)
+        return jsonify({'items': items, 'next_cursor': encode_cursor(next_cursor) if next_cursor else None,
+                        'limit': int(limit)}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# → (filters, cursor) for history.page; raises ValueError on bad input
+def history_args():
+    filters = {k: request.args.get(k, '').strip() for k in ('student_id', 'exam_id', 'action', 'since', 'until')}
+    if filters['exam_id'] and not filters['exam_id'].isdigit():
+        raise ValueError('exam_id must be an integer')
+    for k in ('since', 'until'):
+        if filters[k]:
+            try:
+                filters[k] = datetime.fromisoformat(filters[k]).isoformat()
+            except ValueError:
+                raise ValueError(f'{k} must be an ISO date or timestamp')
+    cursor = request.args.get('cursor')
+    cursor = decode_cursor(cursor, (str, int)) if cursor else None
+    if cursor:
+        try:
+            datetime.fromisoformat(cursor[0])
+        except ValueError:
+            raise ValueError('Invalid cursor')
+    return filters, cursor
+
+# ============ find my seat ===========
+# a student's upcoming exams with legan / room / floor from the
+# precomputed student_seat_index (?all=1 includes past exams)
+@api_routes.route('/api/v1/students/<student_id>/seats', methods=['GET'])
+def get_student_seats(student_id):
+    student_id = student_id.strip()
+    if not student_id or len(student_id) > 64:
+        return jsonify({'error': 'Invalid student id'}), 400
+    include_past = request_flag('all')
+    try:
+        def produce():
+            seats = seat_index.lookup(student_id, include_past)
+            return {'student_id': student_id, 'count': len(seats), 'exams': seats}, [s['exam_id'] for s in seats]
+        return cache.cached_json('student-seats', produce, args={'student_id': student_id, 'all': '1' if include_past else ''},
+                                 store=seat_index.seat_cache)
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
 # ============ assign endpoint ===========
 @api_routes.route('/api/v1/assign/<int:exam_id>', methods=['POST'])
+@idempotent
 def assign_course(exam_id):
     try:
         with dbmod.get_cursor(True) as (conn, cur):
-            cur.execute('SELECT * FROM exam WHERE Exam_id=%s', (exam_id,))
-            exam = cur.fetchone()
+            exam = seating.load_exam(cur, exam_id)
             if not exam:
                 return jsonify({'error':'Exam not found'}), 404
             program = str(exam['program']).upper()
             level = str(exam['level'])
             course = str(exam['code_course'])
 
-            cur.execute('SELECT Legan_id, legan_name, room_id, level, capacity, program FROM legan WHERE program=%s AND level=%s ORDER BY Legan_id ASC', (program, level))
-            legans = cur.fetchall()
-            if not legans:
-                return jsonify({'error':'No legans available for this program/level'}), 400
+            seating.lock_slots(cur, [seating.slot_key(exam)])
+            seating.lock_exams(cur, [exam_id])
+            # assigning twice returns the existing seating instead of adding seats
+            occupied, _ = seating.load_occupancy(cur, exam_id)
+            if occupied:
+                seated = sum(occupied.values())
+                legans = seating.load_legans(cur, program, level)
+                return jsonify({'message': f'Exam already assigned ({seated} students seated).', 'already_assigned': True,
+                                'assigned': 0, 'seated': seated,
+                                'legans': [leg for leg in seating.fill_summary(legans, {}, occupied) if leg['filled']]}), 200
+
+            # checked under the slot lock, so no other exam of the slot is seated meanwhile
+            if blocks_on_conflicts():
+                clashes = conflicts.exam_conflicts(cur, exam_id)
+                if clashes:
+                    return jsonify({'error': f'{len(clashes)} students of this exam have another exam in the same slot',
+                                    'conflicts': clashes}), 409
 
-            cur.execute('SELECT student_ID, student_name FROM registration WHERE program=%s AND course=%s ORDER BY level ASC, student_ID', (program, course))
-            students = cur.fetchall()
-            if not students:
-                return jsonify({'error':'No registered students for this course'}), 400
-
-            inserted = 0
-            idx = 0
-            total = len(students)
-
-            for leg in legans:
-                cap = int(leg.get('capacity') or 0)
-                for _ in range(cap):
-                    if idx >= total:
-                        break
-                    s = students[idx]
-                    idx += 1
-                    cur.execute('INSERT INTO student_legan (legan_id, student_id, Exam) VALUES (%s,%s,%s)', (leg['Legan_id'], s['student_ID'], exam_id))
-                    cur.execute("INSERT INTO student_legan_history (legan_id, student_id, exam_id, action) VALUES (%s,%s,%s,%s)", (leg['Legan_id'], s['student_ID'], exam_id, 'ASSIGNED'))
-                    inserted += 1
-                if idx >= total:
-                    break
+            if request.args.get('strategy') == 'pack':
+                # room-minimizing plan that also respects the slot's other exams
+                placements, summaries = seating.plan_batch(cur, [exam], 'pack', request_flag('alternate'))
+                summary = summaries[0]
+                if summary.get('error'):
+                    return jsonify({'error': summary['error']}), 400
+                total, legan_summary = summary['total'], summary.get('legans', [])
+            else:
+                legans = seating.load_legans(cur, program, level)
+                if not legans:
+                    return jsonify({'error':'No legans available for this program/level'}), 400
+
+                students = seating.load_students(cur, program, course)
+                if not students:
+                    return jsonify({'error':'No registered students for this course'}), 400
+
+                # seats other exams of the same day/period already use
+                slot = seating.slot_key(exam)
+                slot_occupied = seating.load_slot_occupancy(cur, [slot]).get(slot, {})
+                total = len(students)
+                placements, fill = seating.plan_seats(legans, students, slot_occupied, exam_id=exam_id)
+                legan_summary = seating.fill_summary(legans, fill, slot_occupied)
+            inserted = seating.write_placements(cur, placements, 'ASSIGNED')
 
             if inserted > 0:
                 cur.execute('UPDATE exam SET assigned=1 WHERE Exam_id=%s', (exam_id,))
-        return jsonify({'message': f'✅ Assigned {inserted}/{total} students.','assigned': inserted,'total': total}), 200
+        after_seating_change([exam_id] if inserted else [])
+        return jsonify({'message': f'✅ Assigned {inserted}/{total} students.','assigned': inserted,'total': total,
+                        'legans': legan_summary}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# ?block_conflicts=1 (or SEATING_BLOCK_ON_CONFLICTS=1) refuses exams with
+# clashes; ?force=1 seats them anyway
+def blocks_on_conflicts():
+    if request_flag('force'):
+        return False
+    return request_flag('block_conflicts') or conflicts.BLOCK_ON_CONFLICTS
+
+# ============ batch assign endpoint ===========
+# seats every unassigned exam matching the build_filters filters;
+# exams in the same day/period slot share legan capacity
+@api_routes.route('/api/v1/assign/batch', methods=['POST'])
+@idempotent
+def assign_batch():
+    try:
+        args = request_filter_args()
+        if request_flag('async'):
+            if (args.get('strategy') or 'sequential') not in seating.STRATEGIES:
+                return jsonify({'error': f"strategy must be one of: {', '.join(seating.STRATEGIES)}"}), 400
+            return submit_job('assign_batch', {'filters': args})
+        payload, status = do_assign_batch(args)
+        return jsonify(payload), status
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+# → (payload, status); ctx is the JobContext when run as a job.
+# args may also carry strategy=sequential|pack, alternate=1 (pack: mix the
+# courses sharing a legan seat by seat) and dry_run=1 (plan only)
+def do_assign_batch(args, ctx=None):
+    strategy = args.get('strategy') or 'sequential'
+    if strategy not in seating.STRATEGIES:
+        return {'error': f"strategy must be one of: {', '.join(seating.STRATEGIES)}"}, 400
+    dry_run = truthy(args.get('dry_run'))
+    where_sql, params = build_filters('e', args)
+    where_sql = and_where(where_sql, 'COALESCE(e.assigned, 0) = 0')
+    with dbmod.get_cursor(not dry_run) as (conn, cur):
+        cur.execute(f'SELECT e.* FROM exam e {where_sql} ORDER BY {EXAM_ORDER_SQL}', params)
+        exams = cur.fetchall()
+        if not exams:
+            return {'message':'No unassigned exams match these filters','exams': [],'assigned': 0}, 200
+        if not dry_run:
+            seating.lock_slots(cur, [seating.slot_key(e) for e in exams])
+            seating.lock_exams(cur, [e['exam_id'] for e in exams])
+            # another request may have seated some of them while we waited
+            cur.execute('SELECT Exam_id FROM exam WHERE Exam_id = ANY(%s) AND COALESCE(assigned, 0) = 0', ([e['exam_id'] for e in exams],))
+            still_open = {r['exam_id'] for r in cur.fetchall()}
+            exams = [e for e in exams if e['exam_id'] in still_open]
+            if not exams:
+                return {'message':'No unassigned exams match these filters','exams': [],'assigned': 0}, 200
+        if ctx:
+            ctx.progress(10, f'Planning {len(exams)} exams')
+
+        placements, summaries = seating.plan_batch(cur, exams, strategy, truthy(args.get('alternate')))
+        if dry_run:
+            return {'message': f'Dry run: {len(placements)} students would be seated across {len(exams)} exams.',
+                    'dry_run': True, 'strategy': strategy, 'assigned': len(placements),
+                    'rooms_used': seating.rooms_used(summaries), 'exams': summaries}, 200
+        if ctx:
+            ctx.progress(50, f'Writing {len(placements)} seats')
+        inserted = seating.write_placements(cur, placements, 'ASSIGNED')
+        seated = [s['exam_id'] for s in summaries if s['assigned'] > 0]
+        if seated:
+            cur.execute('UPDATE exam SET assigned=1 WHERE Exam_id = ANY(%s)', (seated,))
+        if ctx:
+            # last chance to cancel before the transaction commits
+            ctx.progress(90, 'Committing')
+    after_seating_change(seated)
+    return {'message': f'✅ Assigned {inserted} students across {len(seated)}/{len(exams)} exams.',
+            'strategy': strategy, 'assigned': inserted, 'rooms_used': seating.rooms_used(summaries), 'exams': summaries}, 200
+
 # ============ reassign endpoint (new students only) ===========
 @api_routes.route('/api/v1/reassign/<int:exam_id>', methods=['POST'])
+@idempotent
 def reassign_new_students(exam_id):
     try:
-        with dbmod.get_cursor(True) as (conn, cur):
-            cur.execute('SELECT * FROM exam WHERE Exam_id=%s', (exam_id,))
-            exam = cur.fetchone()
+        dry_run = request_flag('dry_run')
+        with dbmod.get_cursor(not dry_run) as (conn, cur):
+            exam = seating.load_exam(cur, exam_id)
             if not exam:
                 return jsonify({'error':'Exam not found'}), 404
             program = str(exam['program']).upper()
             level = str(exam['level'])
             course = str(exam['code_course'])
 
-            cur.execute('SELECT Legan_id, legan_name, room_id, level, capacity, program FROM legan WHERE program=%s AND level=%s ORDER BY Legan_id ASC', (program, level))
-            legans = cur.fetchall()
+            if not dry_run:
+                seating.lock_slots(cur, [seating.slot_key(exam)])
+                seating.lock_exams(cur, [exam_id])
+
+            legans = seating.load_legans(cur, program, level)
             if not legans:
                 return jsonify({'error':'No legans available for this program/level'}), 400
 
-            cur.execute('SELECT student_ID, student_name FROM registration WHERE program=%s AND course=%s ORDER BY level ASC, student_ID', (program, course))
-            all_students = cur.fetchall()
-            if not all_students:
-                return jsonify({'error':'No students registered for this course'}), 400
-
-            cur.execute('SELECT student_id FROM student_legan WHERE Exam=%s', (exam_id,))
-            assigned = cur.fetchall()
-            assigned_ids = {r['student_id'] for r in assigned}
-
-            new_students = [s for s in all_students if s['student_ID'] not in assigned_ids]
+            new_students = seating.load_unseated_students(cur, program, course, exam_id)
             if not new_students:
+                cur.execute('SELECT 1 FROM registration WHERE program=%s AND course=%s LIMIT 1', (program, course))
+                if not cur.fetchone():
+                    return jsonify({'error':'No students registered for this course'}), 400
                 return jsonify({'message':'✅ No new students found. All already assigned.'}), 200
 
-            # last used legan
-            cur.execute('SELECT legan_id FROM student_legan WHERE Exam=%s ORDER BY student_Legan_id DESC LIMIT 1', (exam_id,))
-            last_used = cur.fetchone()
-            last_used_id = last_used['legan_id'] if last_used else None
-
-            start_index = 0
-            if last_used_id:
-                for i, leg in enumerate(legans):
-                    if leg['Legan_id'] == last_used_id:
-                        start_index = i
-                        break
-
-            inserted = 0
-            idx = 0
+            # fill from the last used legan, then wrap around; free seats
+            # count every exam of the day/period, which may share legans
+            _, last_used_id = seating.load_occupancy(cur, exam_id)
+            slot = seating.slot_key(exam)
+            slot_occupied = seating.load_slot_occupancy(cur, [slot]).get(slot, {})
+            placements, fill = seating.plan_reassign(legans, new_students, slot_occupied, last_used_id, exam_id=exam_id)
             total_new = len(new_students)
 
-            # fill from start_index then wrap
-            for i in range(start_index, len(legans)):
-                leg = legans[i]
-                cap = int(leg.get('capacity') or 0)
-                cur.execute('SELECT COUNT(*) AS c FROM student_legan WHERE legan_id=%s AND Exam=%s', (leg['Legan_id'], exam_id))
-                used = cur.fetchone()['c']
-                free = max(0, cap - used)
-                for _ in range(free):
-                    if idx >= total_new:
-                        break
-                    s = new_students[idx]
-                    idx += 1
-                    cur.execute('INSERT INTO student_legan (legan_id, student_id, Exam) VALUES (%s,%s,%s)', (leg['Legan_id'], s['student_ID'], exam_id))
-                    cur.execute("INSERT INTO student_legan_history (legan_id, student_id, exam_id, action) VALUES (%s,%s,%s,%s)", (leg['Legan_id'], s['student_ID'], exam_id, 'REASSIGNED'))
-                    inserted += 1
-                if idx >= total_new:
-                    break
-            if idx < total_new:
-                for i in range(0, start_index):
-                    leg = legans[i]
-                    cap = int(leg.get('capacity') or 0)
-                    cur.execute('SELECT COUNT(*) AS c FROM student_legan WHERE legan_id=%s AND Exam=%s', (leg['Legan_id'], exam_id))
-                    used = cur.fetchone()['c']
-                    free = max(0, cap - used)
-                    for _ in range(free):
-                        if idx >= total_new:
-                            break
-                        s = new_students[idx]
-                        idx += 1
-                        cur.execute('INSERT INTO student_legan (legan_id, student_id, Exam) VALUES (%s,%s,%s)', (leg['Legan_id'], s['student_ID'], exam_id))
-                        cur.execute("INSERT INTO student_legan_history (legan_id, student_id, exam_id, action) VALUES (%s,%s,%s,%s)", (leg['Legan_id'], s['student_ID'], exam_id, 'REASSIGNED'))
-                        inserted += 1
-                    if idx >= total_new:
-                        break
-
-            return jsonify({'message': f'🔄 Reassigned {inserted}/{total_new} new students.', 'new_assigned': inserted, 'new_total': total_new, 'started_from_legan': last_used_id or legans[0]['Legan_id']}), 200
+            result = {'new_total': total_new, 'started_from_legan': last_used_id or legans[0]['legan_id'],
+                      'legans': seating.fill_summary(legans, fill, slot_occupied), 'dry_run': dry_run}
+            if dry_run:
+                result.update({'message': f'🔎 Would reassign {len(placements)}/{total_new} new students.', 'new_assigned': len(placements),
+                               'placements': [{'legan_id': lid, 'student_id': sid} for lid, sid, _ in placements]})
+                return jsonify(result), 200
+
+            inserted = seating.write_placements(cur, placements, 'REASSIGNED')
+            result.update({'message': f'🔄 Reassigned {inserted}/{total_new} new students.', 'new_assigned': inserted})
+        after_seating_change([exam_id] if inserted else [])
+        return jsonify(result), 200
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
 # ============ unassign endpoint ============
 @api_routes.route('/api/v1/unassign/<int:exam_id>', methods=['POST'])
+@idempotent
 def unassign_course(exam_id):
     try:
         with dbmod.get_cursor(True) as (conn, cur):
-            cur.execute('SELECT * FROM exam WHERE Exam_id=%s', (exam_id,))
-            exam = cur.fetchone()
-            if not exam:
+            cur.execute('SELECT Exam_id FROM exam WHERE Exam_id=%s', (exam_id,))
+            if not cur.fetchone():
                 return jsonify({'error':'Exam not found'}), 404
-            cur.execute('SELECT legan_id, student_id FROM student_legan WHERE Exam=%s', (exam_id,))
-            rows = cur.fetchall()
-            if not rows:
+            seating.lock_exams(cur, [exam_id])
+            cur.execute('SELECT 1 FROM student_legan WHERE Exam=%s LIMIT 1', (exam_id,))
+            if not cur.fetchone():
                 return jsonify({'message':'No students assigned for this exam'}), 200
-            for r in rows:
-                cur.execute("INSERT INTO student_legan_history (legan_id, student_id, exam_id, action) VALUES (%s,%s,%s,%s)", (r['legan_id'], r['student_id'], exam_id, 'UNASSIGNED'))
-            cur.execute('DELETE FROM student_legan WHERE Exam=%s', (exam_id,))
-            cur.execute('UPDATE exam SET assigned=0 WHERE Exam_id=%s', (exam_id,))
-            return jsonify({'message': f'✅ Unassigned {len(rows)} students.', 'unassigned': len(rows)}), 200
+            removed = seating.unassign_exams(cur, [exam_id]).get(exam_id, 0)
+        after_seating_change([exam_id])
+        return jsonify({'message': f'✅ Unassigned {removed} students.', 'unassigned': removed}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# ============ batch unassign endpoint ============
+# clears every exam matching the build_filters filters, e.g. a whole
+# day; ?all=1 is required to clear the session without any filter
+@api_routes.route('/api/v1/unassign/batch', methods=['POST'])
+@idempotent
+def unassign_batch():
+    try:
+        where_sql, params = build_filters('e', request_filter_args())
+        if not where_sql and not request_flag('all'):
+            return jsonify({'error':'At least one filter is required (or all=1)'}), 400
+        with dbmod.get_cursor(True) as (conn, cur):
+            cur.execute(f'SELECT e.Exam_id FROM exam e {where_sql}', params)
+            exam_ids = [r['exam_id'] for r in cur.fetchall()]
+            seating.lock_exams(cur, exam_ids)
+            counts = seating.unassign_exams(cur, exam_ids)
+        after_seating_change(exam_ids)
+        total = sum(counts.values())
+        return jsonify({'message': f'✅ Unassigned {total} students from {len(counts)} exams.', 'unassigned': total,
+                        'exams': [{'exam_id': eid, 'unassigned': counts.get(eid, 0)} for eid in exam_ids]}), 200
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
 # ============ print JSON (grouped) ============
+PRINT_SQL = """
+    SELECT
+      e.Exam_id, e.year, e.program AS program_id, e.level AS exam_level, e.code_course AS course,
+      e.day, e.period_id, e.date, e.type,
+      l.Legan_id AS legan_id, l.legan_name, l.capacity,
+      r.room_name, r.floor AS floor,
+      p.logo AS program_logo,
+      p.arabic_name AS program_arabic_name,
+      p.English_name AS program_english_name,
+      sl.student_legan_id, s.student_ID, s.student_name,s.payment,s.level
+    FROM exam e
+    LEFT JOIN student_legan sl ON sl.exam = e.Exam_id
+    LEFT JOIN legan l ON l.Legan_id=sl.legan_id
+    LEFT JOIN rooms r ON r.room_id=l.room_id
+    LEFT JOIN programs p ON p.program_id=e.program
+    LEFT JOIN registration s ON s.student_ID=sl.student_id
+    {where_sql}
+    ORDER BY {order_sql}, l.Legan_id, s.student_ID
+"""
+
+def print_exam_info(row):
+    return {'type': (row['type'] if row else None), 'program': (row['program_id'] if row else None), 'year': (row['year'] if row else None)}
+
+# groups print rows (sorted by exam, legan) into one dict per
+# exam/legan as they arrive; a legan is yielded once the next one starts
+def group_print_rows(rows):
+    current_key, current, seen = None, None, set()
+    for row in rows:
+        if not row.get('legan_id'):
+            continue
+        key = (row['exam_id'], row['legan_id'])
+        if key != current_key:
+            if current is not None:
+                yield current
+            current_key, seen = key, set()
+            current = {
+                'exam_id': row['exam_id'],
+                'legan_id': row['legan_id'],
+                'legan_name': row['legan_name'],
+                'room_name': row['room_name'],
+                'floor': row['floor'],
+                'capacity': row['capacity'],
+                'level': row['exam_level'],
+                'course': row['course'],
+                'day': row['day'],
+                'period_id': row['period_id'],
+                'date': str(row['date']) if row['date'] else None,
+                'students': []
+            }
+        if row.get('student_id') and row['student_legan_id'] not in seen:
+            seen.add(row['student_legan_id'])
+            current['students'].append({'student_legan_id': row['student_legan_id'], 'student_id': row['student_id'], 'student_name': row['student_name'], 'payment': row['payment'], 'level': row['level']})
+    if current is not None:
+        yield current
+
+# ?stream=1 → rows come from a server-side cursor in chunks and the
+# JSON document is written out legan by legan. The status is already
+# 200 once the first chunk is out, so a later failure closes the
+# document with an "error" key (and no exam_info) instead of cutting it off
+def stream_print_json(sql, params):
+    def generate():
+        info = {}
+        def rows():
+            for row in dbmod.stream(sql, params):
+                if not info:
+                    info.update(print_exam_info(row))
+                yield row
+        yield '{"legans": ['
+        try:
+            for i, legan in enumerate(group_print_rows(rows())):
+                yield (',' if i else '') + json.dumps(legan, default=str)
+        except Exception as e:
+            traceback.print_exc()
+            yield '], "error": ' + json.dumps(str(e)) + '}'
+            return
+        yield '], "exam_info": ' + json.dumps(info or print_exam_info(None), default=str) + '}'
+    return Response(generate(), mimetype='application/json')
+
 @api_routes.route('/api/v1/students-legans/print', methods=['GET'])
 def print_students_legans_json():
     try:
         where_sql, params = build_filters('e')
-        sql = f"""
-            SELECT
-              e.Exam_id, e.year, e.program AS program_id, e.level AS exam_level, e.code_course AS course,
-              e.day, e.period_id, e.date, e.type,
-              l.Legan_id AS legan_id, l.legan_name, l.capacity,
-              r.room_name, r.floor AS floor,
-              p.logo AS program_logo,
-              p.arabic_name AS program_arabic_name,
-              p.English_name AS program_english_name,
-              sl.student_legan_id, s.student_ID, s.student_name,s.payment,s.level
-            FROM exam e
-            LEFT JOIN student_legan sl ON sl."Exam_id" = e.Exam_id
-            LEFT JOIN legan l ON l.Legan_id=sl.legan_id
-            LEFT JOIN rooms r ON r.room_id=l.room_id
-            LEFT JOIN programs p ON p.program_id=e.program
-            LEFT JOIN registration s ON s.student_ID=sl.student_id
-            {where_sql}
-            ORDER BY {DAY_ORDER_CASE}, {PERIOD_MINUTES_SQL_PG}, e.Exam_id, l.Legan_id, s.student_ID
-        """
+        sql = PRINT_SQL.format(where_sql=where_sql, order_sql=EXAM_ORDER_SQL)
+        if request_flag('stream'):
+            return stream_print_json(sql, params)
         rows = dbmod.fetchall(sql, params)
-        bucket = {}
-        for row in rows:
-            if not row.get('legan_id'):
-                continue
-            key = f"{row['exam_id']}_{row['legan_id']}"
-            if key not in bucket:
-                bucket[key] = {
-                    'exam_id': row['Exam_id'],
-                    'legan_id': row['legan_id'],
-                    'legan_name': row['legan_name'],
-                    'room_name': row['room_name'],
-                    'floor': row['floor'],
-                    'capacity': row['capacity'],
-                    'level': row['exam_level'],
-                    'course': row['course'],
-                    'day': row['day'],
-                    'period_id': row['period_id'],
-                    'date': str(row['date']) if row['date'] else None,
-                    'students': []
-                }
-            if row.get('student_ID'):
-                students = bucket[key]['students']
-                if not any(s['student_legan_id'] == row['student_legan_id'] for s in students):
-                    students.append({'student_legan_id': row['student_legan_id'], 'student_id': row['student_ID'], 'student_name': row['student_name'], 'payment': row['payment'], 'level': row['level']})
-        legans = list(bucket.values())
-        return jsonify({'legans': legans, 'exam_info': {'type': (rows[0]['type'] if rows else None), 'program': (rows[0]['program_id'] if rows else None),'year': (rows[0]['year'] if rows else None)}}), 200
+        legans = list(group_print_rows(rows))
+        return jsonify({'legans': legans, 'exam_info': print_exam_info(rows[0] if rows else None)}), 200
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
-# ============ print PDF (simple) ============
+# ============ print PDF (cached) ============
+# exam_id accepts one id or a comma separated list; any other
+# build_filters filter (e.g. day / date / period_id) selects whole days
 @api_routes.route('/api/v1/students-legans/print/pdf', methods=['GET'])
 def print_students_legans_pdf():
     try:
-        exam_id = request.args.get('exam_id')
-        if not exam_id:
-            return jsonify({'error':'exam_id is required'}), 400
-        where_sql, params = build_filters('e')
-        sql = f"""
-            SELECT e.Exam_id, e.year, e.program AS program_id, e.level, e.code_course AS course,
-                   e.day, e.period_id, e.date, e.type,
-                   l.Legan_id AS legan_id, l.legan_name, l.capacity,
-                   r.room_name, r.floor AS floor,
-                   sl.student_legan_id, s.student_ID, s.student_name
-            FROM exam e
-    LEFT JOIN student_legan sl ON sl."Exam_id" = e.Exam_id
-            LEFT JOIN legan l ON l.Legan_id=sl.legan_id
-            LEFT JOIN rooms r ON r.room_id=l.room_id
-            LEFT JOIN registration s ON s.student_ID=sl.student_id
-            WHERE e.Exam_id = %s
-            ORDER BY {DAY_ORDER_CASE}, {PERIOD_MINUTES_SQL_PG}, e.Exam_id, l.Legan_id, s.student_ID
-        """
-        rows = dbmod.fetchall(sql, (exam_id,))
-        bucket = {}
-        for row in rows:
-            if not row.get('legan_id'):
-                continue
-            key = f"{row['exam_id']}_{row['legan_id']}"
-            bucket.setdefault(key, {'legan_id': row['legan_id'], 'legan_name': row['legan_name'], 'room_name': row['room_name'], 'floor': row['floor'], 'capacity': row['capacity'], 'students': []})
-            if row.get('student_ID'):
-                bucket[key]['students'].append({'id': row['student_ID'], 'name': row['student_name']})
-        # build PDF using reportlab if available
+        args = request.args.to_dict()
+        if request_flag('async'):
+            args.pop('async', None)
+            return submit_job('pdf', {'args': args})
+        result, status = do_render_pdf(args)
+        if status != 200:
+            return jsonify(result), status
+        response = send_file(result['path'], as_attachment=True, download_name=result['download_name'], mimetype='application/pdf')
+        response.headers['X-Cache'] = 'HIT' if result['cache_hit'] else 'MISS'
+        return response
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# → (result, status); on success result has path / download_name / cache_hit
+def do_render_pdf(args):
+    args = dict(args)
+    raw_ids = args.pop('exam_id', '') or ''
+    try:
+        exam_ids = [int(x) for x in str(raw_ids).split(',') if x.strip()]
+    except ValueError:
+        return {'error':'exam_id must be an integer or a comma separated list'}, 400
+    where_sql, params = build_filters('e', args)
+    if exam_ids:
+        where_sql = and_where(where_sql, 'e.Exam_id = ANY(%s)')
+        params.append(exam_ids)
+    if not where_sql:
+        return {'error':'exam_id or another filter is required'}, 400
+
+    # read under the cursor, render after it is returned to the pool
+    with dbmod.get_cursor(False) as (conn, cur):
+        cur.execute(f'SELECT e.Exam_id FROM exam e {where_sql}', params)
+        found = sorted(r['exam_id'] for r in cur.fetchall())
+        if not found:
+            return {'error':'No exams match these filters'}, 404
+        key, path = pdf.lookup(cur, found)
+        legans = None
+        if not path:
+            cur.execute(PRINT_SQL.format(where_sql='WHERE e.Exam_id = ANY(%s)', order_sql=EXAM_ORDER_SQL), (found,))
+            legans = list(group_print_rows(cur.fetchall()))
+    hit = path is not None
+    if not hit:
         try:
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.pagesizes import A4
-        except Exception:
-            return jsonify({'error':'PDF dependency not installed'}), 501
-        pdf_buffer = BytesIO()
-        p = canvas.Canvas(pdf_buffer)
-        width, height = A4
-        for key, data in bucket.items():
-            p.setFont('Helvetica-Bold', 14)
-            p.drawString(40, height-50, f"Legen: {data['legan_name']}")
-            y = height-80
-            p.setFont('Helvetica', 11)
-            for s in data['students']:
-                p.drawString(50, y, f"{s['id']} - {s['name']}")
-                y -= 16
-                if y < 80:
-                    p.showPage()
-                    y = height-80
-            p.showPage()
-        p.save()
-        pdf_buffer.seek(0)
-        return send_file(pdf_buffer, as_attachment=True, download_name=f'exam_{exam_id}_legans.pdf', mimetype='application/pdf')
+            path = pdf.render_and_store(key, found, legans)
+        except ImportError:
+            return {'error':'PDF dependency not installed'}, 501
+    name = f'exam_{found[0]}_legans.pdf' if len(found) == 1 else f"exams_{args.get('day') or args.get('date') or len(found)}_legans.pdf"
+    return {'path': path, 'download_name': name, 'cache_hit': hit, 'exam_ids': found}, 200
+
+# ============ background jobs ============
+def submit_job(kind, params, payload=None, payload_name=None):
+    job_id = jobs.submit(kind, params, payload=payload, payload_name=payload_name)
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/api/v1/jobs/{job_id}'}), 202
+
+@jobs.handler('assign_batch')
+def assign_batch_job(ctx):
+    payload, status = do_assign_batch(ctx.params.get('filters') or {}, ctx)
+    if status >= 400:
+        raise RuntimeError(payload.get('error'))
+    return payload
+
+@jobs.handler('import')
+def import_job(ctx):
+    file_storage = FileStorage(stream=BytesIO(ctx.payload or b''), filename=ctx.payload_name)
+    return do_import(ctx.params['kind'], file_storage, ctx.params.get('on_conflict'),
+                     progress=lambda rows: ctx.progress(None, f'{rows} rows read'))
+
+@jobs.handler('pdf')
+def pdf_job(ctx):
+    args = ctx.params.get('args') or {}
+    ctx.progress(5, 'Rendering')
+    result, status = do_render_pdf(args)
+    if status != 200:
+        raise RuntimeError(result.get('error'))
+    # the same URL now answers from the PDF cache
+    return {'download_url': f"/api/v1/students-legans/print/pdf?{urlencode(args)}", 'exam_ids': result['exam_ids'],
+            'download_name': result['download_name']}
+
+@api_routes.route('/api/v1/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        job = jobs.get(job_id)
+        if not job:
+            return jsonify({'error':'Job not found'}), 404
+        return jsonify(job), 200
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@api_routes.route('/api/v1/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    try:
+        status = jobs.cancel(job_id)
+        if status is None:
+            return jsonify({'error':'Job not found'}), 404
+        return jsonify({'job_id': job_id, 'status': status, 'cancel_requested': True}), 202
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+# ============ metrics (Prometheus text format) ============
+# set METRICS_TOKEN to require "Authorization: Bearer <token>"
+@api_routes.route('/api/v1/metrics', methods=['GET'])
+def get_metrics():
+    token = os.getenv('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error':'Unauthorized'}), 401
+    pool = dbmod.pool_stats()
+    cache_stats = cache.response_cache.stats()
+    seat_stats = seat_index.seat_cache.stats()
+    gauges = {
+        'db_pool_connections': ('Pooled connections by state', [((('state', k),), pool[k]) for k in ('idle', 'in_use', 'waiting', 'size', 'max')]),
+        'db_pool_events_total': ('Pool events since start', [((('event', k),), pool[k]) for k in ('checkouts', 'created', 'discarded', 'timeouts', 'pings_failed')]),
+        'response_cache_events_total': ('Response cache events since start', [((('event', k),), cache_stats[k]) for k in ('hits', 'misses', 'evictions', 'invalidations')]),
+        'response_cache_entries': ('Cached responses', [((), cache_stats['entries'])]),
+        'seat_cache_events_total': ('Seat lookup cache events since start', [((('event', k),), seat_stats[k]) for k in ('hits', 'misses', 'evictions', 'invalidations')]),
+        'seat_cache_entries': ('Cached seat lookups', [((), seat_stats['entries'])]),
+    }
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
 
 # End of project files
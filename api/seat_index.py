@@ -0,0 +1,87 @@
+# ===== FILE: api/seat_index.py =====
+# "Find my seat": per-student seat index (student_seat_index, see
+# migrations/0009) plus an in-process hot cache of the lookup responses.
+# Seat changes reach the index through triggers on student_legan,
+# inside the transaction that made them.
+#   rebuild(cur)             → rebuild everything (exam / legan / room
+#                              details changed)
+#   lookup(student_id)       → the student's seats, soonest first
+# The hot cache is its own ResponseCache so thousands of students do not
+# evict the listing entries; it is cleared on every seating change in
+# this worker, and other workers see changes after SEAT_CACHE_TTL (or at
+# once with SEAT_CACHE_SHARED=1, which costs a query per lookup).
+import os
+from datetime import date
+import db as dbmod
+from .cache import ResponseCache
+
+SEAT_CACHE_MAX_ENTRIES = int(os.getenv('SEAT_CACHE_MAX_ENTRIES', '20000'))
+SEAT_CACHE_MAX_BYTES = int(os.getenv('SEAT_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+SEAT_CACHE_TTL = float(os.getenv('SEAT_CACHE_TTL', '30'))
+SEAT_CACHE_SHARED = os.getenv('SEAT_CACHE_SHARED', '0') == '1'
+
+seat_cache = ResponseCache(max_entries=SEAT_CACHE_MAX_ENTRIES, max_bytes=SEAT_CACHE_MAX_BYTES, ttl=SEAT_CACHE_TTL,
+                           shared=SEAT_CACHE_SHARED)
+
+COLUMNS = ('student_id, exam_id, program, code_course, type, day, period_id, date, '
+           'day_order, period_start_minutes, legan_id, legan_name, room_id, room_name, floor')
+
+# {where_sql} filters student_legan (alias sl)
+FILL_SQL = f"""
+    INSERT INTO student_seat_index ({COLUMNS})
+    SELECT sl.student_id, e.Exam_id, e.program, e.code_course, e.type, e.day, e.period_id, e.date,
+           e.day_order, e.period_start_minutes, l.Legan_id, l.legan_name, r.room_id, r.room_name, r.floor
+    FROM student_legan sl
+    JOIN exam e ON e.Exam_id = sl.exam
+    LEFT JOIN legan l ON l.Legan_id = sl.legan_id
+    LEFT JOIN rooms r ON r.room_id = l.room_id
+    {{where_sql}}
+    ON CONFLICT (student_id, exam_id) DO UPDATE SET
+        program = EXCLUDED.program, code_course = EXCLUDED.code_course, type = EXCLUDED.type,
+        day = EXCLUDED.day, period_id = EXCLUDED.period_id, date = EXCLUDED.date,
+        day_order = EXCLUDED.day_order, period_start_minutes = EXCLUDED.period_start_minutes,
+        legan_id = EXCLUDED.legan_id, legan_name = EXCLUDED.legan_name, room_id = EXCLUDED.room_id,
+        room_name = EXCLUDED.room_name, floor = EXCLUDED.floor, refreshed_at = NOW()
+"""
+
+
+def rebuild(cur):
+    cur.execute('DELETE FROM student_seat_index')
+    cur.execute(FILL_SQL.format(where_sql='WHERE sl.student_id IS NOT NULL'))
+    return cur.rowcount
+
+# exams on or after today (dates that do not parse are kept)
+def is_upcoming(value, today=None):
+    if not value:
+        return True
+    try:
+        return date.fromisoformat(str(value)[:10]) >= (today or date.today())
+    except ValueError:
+        return True
+
+def lookup(student_id, include_past=False):
+    rows = dbmod.fetchall(f"""
+        SELECT {COLUMNS}, refreshed_at FROM student_seat_index
+        WHERE student_id = %s
+        ORDER BY date, day_order, period_start_minutes, exam_id
+    """, (student_id,))
+    today = date.today()
+    seats = []
+    for r in rows:
+        if not include_past and not is_upcoming(r['date'], today):
+            continue
+        seats.append({
+            'exam_id': r['exam_id'],
+            'program': r['program'],
+            'code_course': r['code_course'],
+            'type': r['type'],
+            'day': r['day'],
+            'period_id': r['period_id'],
+            'date': r['date'],
+            'legan_id': r['legan_id'],
+            'legan_name': r['legan_name'],
+            'room_id': r['room_id'],
+            'room_name': r['room_name'],
+            'floor': r['floor'],
+        })
+    return seats
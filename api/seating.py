@@ -0,0 +1,265 @@
+# ===== FILE: api/seating.py =====
+import os
+
+# rows per INSERT statement when writing a seating plan
+WRITE_CHUNK_SIZE = int(os.getenv('SEATING_WRITE_CHUNK_SIZE', '10000'))
+
+# advisory lock classes (two-key form: class, id) held until commit
+EXAM_LOCK = 72630010
+SLOT_LOCK = 72630011
+
+# one statement fills student_legan and its history rows together
+INSERT_PLACEMENTS_SQL = """
+WITH ins AS (
+    INSERT INTO student_legan (legan_id, student_id, exam)
+    SELECT * FROM unnest(%s::integer[], %s::varchar[], %s::integer[])
+    ON CONFLICT (exam, student_id) DO NOTHING
+    RETURNING legan_id, student_id, exam
+)
+INSERT INTO student_legan_history (legan_id, student_id, exam_id, action)
+SELECT legan_id, student_id, exam, %s FROM ins
+"""
+
+# delete the seats of many exams and log them to history in one statement
+UNASSIGN_SQL = """
+WITH del AS (
+    DELETE FROM student_legan WHERE exam = ANY(%s)
+    RETURNING legan_id, student_id, exam
+), hist AS (
+    INSERT INTO student_legan_history (legan_id, student_id, exam_id, action)
+    SELECT legan_id, student_id, exam, 'UNASSIGNED' FROM del
+    RETURNING exam_id
+)
+SELECT exam_id, COUNT(*) AS unassigned FROM hist GROUP BY exam_id
+"""
+
+# --------- locking ----------
+# every mutation of an exam's seats runs under its transaction-scoped
+# advisory lock; locks are taken in sorted order (slots before exams) so
+# concurrent batches cannot deadlock
+def lock_exams(cur, exam_ids):
+    exam_ids = sorted({int(e) for e in exam_ids})
+    if exam_ids:
+        cur.execute('SELECT pg_advisory_xact_lock(%s, x) FROM unnest(%s::integer[]) AS x', (EXAM_LOCK, exam_ids))
+
+# planners that read a slot's free capacity also lock the slot, so two
+# batches cannot hand out the same free seats
+def lock_slots(cur, slots):
+    keys = sorted({'|'.join('' if v is None else str(v) for v in slot) for slot in slots})
+    if keys:
+        cur.execute('SELECT pg_advisory_xact_lock(%s, hashtext(k)) FROM unnest(%s::text[]) AS k', (SLOT_LOCK, keys))
+
+# --------- loaders ----------
+def load_exam(cur, exam_id):
+    cur.execute('SELECT * FROM exam WHERE Exam_id=%s', (exam_id,))
+    return cur.fetchone()
+
+def load_legans(cur, program, level):
+    cur.execute('SELECT Legan_id AS legan_id, legan_name, room_id, level, capacity, program FROM legan WHERE program=%s AND level=%s ORDER BY Legan_id ASC', (program, level))
+    return cur.fetchall()
+
+def load_students(cur, program, course):
+    cur.execute('SELECT student_ID AS student_id, student_name FROM registration WHERE program=%s AND course=%s ORDER BY level ASC, student_ID', (program, course))
+    return cur.fetchall()
+
+# registered students of the course that have no seat yet for this exam
+def load_unseated_students(cur, program, course, exam_id):
+    cur.execute("""
+        SELECT r.student_ID AS student_id, r.student_name
+        FROM registration r
+        WHERE r.program=%s AND r.course=%s
+          AND NOT EXISTS (SELECT 1 FROM student_legan sl WHERE sl.exam=%s AND sl.student_id=r.student_ID)
+        ORDER BY r.level ASC, r.student_ID
+    """, (program, course, exam_id))
+    return cur.fetchall()
+
+# seats used per legan for one exam, plus the legan written last
+# (read from the trigger-maintained legan_occupancy summary)
+def load_occupancy(cur, exam_id):
+    cur.execute('SELECT legan_id, used, last_row FROM legan_occupancy WHERE exam=%s', (exam_id,))
+    rows = cur.fetchall()
+    occupied = {r['legan_id']: int(r['used']) for r in rows}
+    last_used = max(rows, key=lambda r: r['last_row'] or 0)['legan_id'] if rows else None
+    return occupied, last_used
+
+# legans starting at start_legan_id, wrapping around to the first ones
+def rotate_legans(legans, start_legan_id):
+    for i, leg in enumerate(legans):
+        if leg['legan_id'] == start_legan_id:
+            return legans[i:] + legans[:i]
+    return list(legans)
+
+# late registrations of an exam: continue from the legan written last and
+# wrap around; slot_occupied counts the seats of every exam in the slot
+def plan_reassign(legans, students, slot_occupied, last_used_id, exam_id=None):
+    return plan_seats(rotate_legans(legans, last_used_id), students, slot_occupied, exam_id=exam_id)
+
+# legans for many (program, level) pairs → {(program, level): [legan, ...]}
+def load_legans_for(cur, pairs):
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return {}
+    cur.execute("""
+        SELECT l.Legan_id AS legan_id, l.legan_name, l.room_id, l.level, l.capacity, l.program
+        FROM legan l
+        JOIN unnest(%s::varchar[], %s::varchar[]) AS k(program, level) ON l.program=k.program AND l.level=k.level
+        ORDER BY l.Legan_id ASC
+    """, ([p for p, _ in pairs], [lv for _, lv in pairs]))
+    out = {}
+    for row in cur.fetchall():
+        out.setdefault((row['program'], row['level']), []).append(row)
+    return out
+
+# registrations for many (program, course) pairs → {(program, course): [student, ...]}
+def load_students_for(cur, pairs):
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return {}
+    cur.execute("""
+        SELECT r.program, r.course, r.student_ID AS student_id, r.student_name
+        FROM registration r
+        JOIN unnest(%s::varchar[], %s::varchar[]) AS k(program, course) ON r.program=k.program AND r.course=k.course
+        ORDER BY r.level ASC, r.student_ID
+    """, ([p for p, _ in pairs], [c for _, c in pairs]))
+    out = {}
+    for row in cur.fetchall():
+        out.setdefault((row['program'], row['course']), []).append(row)
+    return out
+
+# day/period slot an exam runs in; exams in one slot share legan capacity
+def slot_key(exam):
+    return (exam.get('day'), exam.get('period_id'), exam.get('date'))
+
+# seats already used per (slot, legan) by exams seated earlier
+def load_slot_occupancy(cur, slots):
+    slots = sorted(set(slots), key=str)
+    if not slots:
+        return {}
+    cur.execute("""
+        SELECT e.day, e.period_id, e.date, o.legan_id, SUM(o.used) AS used
+        FROM legan_occupancy o
+        JOIN exam e ON e.Exam_id = o.exam
+        JOIN unnest(%s::varchar[], %s::varchar[], %s::varchar[]) AS k(day, period_id, date)
+          ON e.day IS NOT DISTINCT FROM k.day AND e.period_id IS NOT DISTINCT FROM k.period_id AND e.date IS NOT DISTINCT FROM k.date
+        GROUP BY e.day, e.period_id, e.date, o.legan_id
+    """, ([d for d, _, _ in slots], [p for _, p, _ in slots], [dt for _, _, dt in slots]))
+    out = {}
+    for row in cur.fetchall():
+        out.setdefault(slot_key(row), {})[row['legan_id']] = int(row['used'])
+    return out
+
+# --------- planning ----------
+# fill legans in the given order up to their free capacity.
+# returns (placements, fill): placements is a list of
+# (legan_id, student_id, exam_id), fill maps legan_id -> students placed
+def plan_seats(legans, students, occupied=None, exam_id=None):
+    occupied = occupied or {}
+    placements, fill = [], {}
+    idx, total = 0, len(students)
+    for leg in legans:
+        if idx >= total:
+            break
+        lid = leg['legan_id']
+        free = max(0, int(leg.get('capacity') or 0) - occupied.get(lid, 0))
+        take = min(free, total - idx)
+        if take <= 0:
+            continue
+        placements.extend((lid, s['student_id'], exam_id) for s in students[idx:idx + take])
+        fill[lid] = take
+        idx += take
+    return placements, fill
+
+def fill_summary(legans, fill, occupied=None):
+    occupied = occupied or {}
+    return [{
+        'legan_id': leg['legan_id'],
+        'legan_name': leg['legan_name'],
+        'room_id': leg.get('room_id'),
+        'capacity': int(leg.get('capacity') or 0),
+        'filled': occupied.get(leg['legan_id'], 0) + fill.get(leg['legan_id'], 0),
+        'added': fill.get(leg['legan_id'], 0),
+    } for leg in legans]
+
+# plan one slot: exams are seated one after another, each one only
+# getting the capacity the previous exams of the slot left free
+def plan_slot(exams, legans_by_key, students_by_key, occupied):
+    occupied = dict(occupied)
+    placements, summaries = [], []
+    for exam in exams:
+        program = str(exam['program']).upper()
+        legans = legans_by_key.get((program, str(exam['level'])), [])
+        students = students_by_key.get((program, str(exam['code_course'])), [])
+        summary = {'exam_id': exam['exam_id'], 'code_course': exam['code_course'], 'program': exam['program'],
+                   'level': exam['level'], 'day': exam['day'], 'period_id': exam['period_id'],
+                   'date': str(exam['date']) if exam['date'] else None, 'total': len(students), 'assigned': 0}
+        if not legans:
+            summary['error'] = 'No legans available for this program/level'
+        elif not students:
+            summary['error'] = 'No registered students for this course'
+        else:
+            exam_placements, fill = plan_seats(legans, students, occupied, exam_id=exam['exam_id'])
+            summary['legans'] = [leg for leg in fill_summary(legans, fill, occupied) if leg['added']]
+            for lid, n in fill.items():
+                occupied[lid] = occupied.get(lid, 0) + n
+            placements.extend(exam_placements)
+            summary['assigned'] = len(exam_placements)
+        summary['unseated'] = summary['total'] - summary['assigned']
+        summaries.append(summary)
+    return placements, summaries
+
+STRATEGIES = ('sequential', 'pack')
+
+# plan many exams: group them into day/period slots and plan the
+# slots one after another → (placements, per-exam summaries).
+# strategy 'pack' uses planner.pack_slot (fewest rooms per slot)
+def plan_batch(cur, exams, strategy='sequential', alternate=False):
+    slots = {}
+    for exam in exams:
+        slots.setdefault(slot_key(exam), []).append(exam)
+    legans_by_key = load_legans_for(cur, ((str(e['program']).upper(), str(e['level'])) for e in exams))
+    students_by_key = load_students_for(cur, ((str(e['program']).upper(), str(e['code_course'])) for e in exams))
+    occupancy = load_slot_occupancy(cur, slots.keys())
+
+    if strategy == 'pack':
+        from . import planner   # numpy, loaded on first use
+    results = []
+    for key, slot_exams in slots.items():
+        if strategy == 'pack':
+            results.append(planner.pack_slot(slot_exams, legans_by_key, students_by_key, occupancy.get(key, {}), alternate))
+        else:
+            results.append(plan_slot(slot_exams, legans_by_key, students_by_key, occupancy.get(key, {})))
+    placements, summaries = [], []
+    for slot_placements, slot_summaries in results:
+        placements.extend(slot_placements)
+        summaries.extend(slot_summaries)
+    return placements, summaries
+
+# distinct rooms used per slot by the planned seats (a legan without a room counts as one)
+def rooms_used(summaries):
+    rooms = set()
+    for s in summaries:
+        for leg in s.get('legans', []):
+            room = leg['room_id'] if leg.get('room_id') is not None else ('legan', leg['legan_id'])
+            rooms.add((s['day'], s['period_id'], s['date'], room))
+    return len(rooms)
+
+# --------- writing ----------
+# insert (legan_id, student_id, exam_id) rows and their history in bulk
+def write_placements(cur, placements, action):
+    written = 0
+    for start in range(0, len(placements), WRITE_CHUNK_SIZE):
+        chunk = placements[start:start + WRITE_CHUNK_SIZE]
+        legan_ids, student_ids, exam_ids = (list(col) for col in zip(*chunk))
+        cur.execute(INSERT_PLACEMENTS_SQL, (legan_ids, student_ids, exam_ids, action))
+        written += cur.rowcount
+    return written
+
+# remove every seat of the given exams → {exam_id: students unassigned}
+def unassign_exams(cur, exam_ids):
+    exam_ids = list(exam_ids)
+    if not exam_ids:
+        return {}
+    cur.execute(UNASSIGN_SQL, (exam_ids,))
+    counts = {r['exam_id']: int(r['unassigned']) for r in cur.fetchall()}
+    cur.execute('UPDATE exam SET assigned=0 WHERE Exam_id = ANY(%s)', (exam_ids,))
+    return counts
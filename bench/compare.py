@@ -0,0 +1,36 @@
+# ===== FILE: bench/compare.py =====
+# python -m bench.compare baseline.json candidate.json [--metric p50_ms]
+# prints per-scenario deltas between two bench.run reports
+import sys
+import json
+import argparse
+
+
+def load(path):
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark reports')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--metric', default='p50_ms')
+    args = parser.parse_args(argv)
+
+    base, cand = load(args.baseline), load(args.candidate)
+    if base['meta'].get('registrations') != cand['meta'].get('registrations'):
+        print('warning: reports use different scales', file=sys.stderr)
+    print(f"{'scenario':<32} {'base':>10} {'cand':>10} {'change':>9}   queries")
+    for name in sorted(set(base['scenarios']) | set(cand['scenarios'])):
+        b, c = base['scenarios'].get(name), cand['scenarios'].get(name)
+        if not b or not c:
+            print(f"{name:<32} {'-' if not b else b[args.metric]:>10} {'-' if not c else c[args.metric]:>10}")
+            continue
+        bv, cv = b[args.metric], c[args.metric]
+        change = f'{(cv - bv) / bv * 100:+.1f}%' if bv else 'n/a'
+        print(f"{name:<32} {bv:>10.2f} {cv:>10.2f} {change:>9}   {b['queries_per_call']} → {c['queries_per_call']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# ===== FILE: bench/generate.py =====
+# Synthetic university data matching schema.sql.
+#   programs × levels 1-4, each level with COURSES_PER_LEVEL courses;
+#   every student of a level registers all of its courses, so
+#   students ≈ registrations / COURSES_PER_LEVEL.
+#   One final exam per (program, course); the courses of a level are
+#   spread over different day/period slots (no clashes) while other
+#   programs share the same slots, so legans/rooms are contended.
+#   Legans per (program, level) hold ~110% of the level's students.
+import io
+import csv
+import random
+
+PROGRAMS = ['CS', 'IT', 'AI', 'BIO', 'ENG', 'BUS', 'MED', 'PHA']
+LEVELS = ['1', '2', '3', '4']
+COURSES_PER_LEVEL = 6
+DAYS = ['Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday']
+PERIODS = ['9:00-11:00', '12:00-2:00', '3:00-5:00']
+SCALES = {'1k': 1000, '20k': 20000, '100k': 100000}
+
+
+def scale_to_registrations(scale):
+    if scale in SCALES:
+        return SCALES[scale]
+    return int(str(scale).lower().replace('k', '000'))
+
+# returns {table: (columns, rows)}
+def generate(registrations, seed=42):
+    rnd = random.Random(seed)
+    students_total = max(1, registrations // COURSES_PER_LEVEL)
+    groups = [(p, lv) for p in PROGRAMS for lv in LEVELS]
+    # spread students over (program, level) groups with some skew
+    weights = [rnd.uniform(0.5, 1.5) for _ in groups]
+    wsum = sum(weights)
+    sizes = [max(1, round(students_total * w / wsum)) for w in weights]
+
+    programs = [(p, f'برنامج {p}', f'Program {p}', None) for p in PROGRAMS]
+    rooms, legans, exams, students, regs = [], [], [], [], []
+    room_id = legan_id = exam_id = 0
+    student_no = 20200000
+    slots = [(d, per, f'2026-01-{10 + i:02d}') for i, d in enumerate(DAYS) for per in PERIODS]
+
+    for (program, level), size in zip(groups, sizes):
+        courses = [f'{program}{level}{c:02d}' for c in range(1, COURSES_PER_LEVEL + 1)]
+        # legans for this group, ~110% of its students
+        need = int(size * 1.1) + 1
+        while need > 0:
+            room_id += 1
+            legan_id += 1
+            cap = rnd.choice([20, 25, 30, 35, 40])
+            rooms.append((room_id, f'Room {room_id}', cap, str(rnd.randint(0, 5))))
+            legans.append((legan_id, f'{program}-L{level}-{legan_id}', room_id, level, cap, cap, program))
+            need -= cap
+        # one exam per course, each in a different slot
+        for course, (day, period, date) in zip(courses, rnd.sample(slots, len(courses))):
+            exam_id += 1
+            exams.append((exam_id, '2025/2026', 'Fall', 'Final', period, date, program, course, day, level, 0))
+        for _ in range(size):
+            student_no += 1
+            sid = str(student_no)
+            name = f'Student {student_no}'
+            students.append((sid, str(29900000000000 + student_no), name, name, f'{sid}@hnu.edu.eg',
+                             '0100000000', '0120000000', 'Cairo', None))
+            payment = 'paid' if rnd.random() < 0.9 else 'unpaid'
+            group = f'G{rnd.randint(1, 4)}'
+            for course in courses:
+                regs.append((sid[-8:], level, sid, course, group, name, payment, program, None))
+
+    return {
+        'programs': (['program_id', 'arabic_name', 'English_name', 'logo'], programs),
+        'rooms': (['room_id', 'room_name', 'capacity', 'floor'], rooms),
+        'legan': (['Legan_id', 'legan_name', 'room_id', 'level', 'capacity', 'full_capacity', 'program'], legans),
+        'exam': (['Exam_id', 'year', 'semester', 'type', 'period_id', 'date', 'program', 'code_course', 'day', 'level', 'assigned'], exams),
+        'students': (['student_ID', 'NID', 'Arab_name', 'Eng_name', 'HNU_email', 'phone_number', 'parent_number', 'address', 'medical_status'], students),
+        'registration': (['NID', 'level', 'student_ID', 'course', 'student_group', 'student_name', 'payment', 'program', 'notes'], regs),
+    }
+
+# COPY every table of a generated dataset
+def load(cur, dataset):
+    for table, (columns, rows) in dataset.items():
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        buf.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    cur.execute("SELECT setval(pg_get_serial_sequence('rooms', 'room_id'), (SELECT COALESCE(MAX(room_id), 1) FROM rooms))")
+    cur.execute('ANALYZE')
@@ -0,0 +1,234 @@
+# ===== FILE: bench/run.py =====
+# Reproducible benchmark of the seating hot paths.
+#   python -m bench.run --scale 20k --repeat 5 --out bench-20k.json
+# Creates a throwaway database next to BENCH_DATABASE_URL (default
+# postgresql://postgres@localhost/postgres), applies schema.sql and the
+# migrations, loads a synthetic dataset (bench/generate.py), then times
+# the endpoints through the Flask test client. Results (latency
+# percentiles, SQL statements per call, peak Python memory) are written
+# as JSON; compare two runs with python -m bench.compare a.json b.json.
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+# must be set before db / api are imported
+os.environ.setdefault('DB_SSLMODE', 'prefer')
+os.environ.setdefault('AUTO_MIGRATE', '0')
+# no background job threads: the scenarios are synchronous, and idle
+# pollers would hold connections to the database dropped at the end
+os.environ['JOB_RUNNER'] = '0'
+_PDF_DIR = tempfile.mkdtemp(prefix='bench_pdf_')
+os.environ['PDF_CACHE_DIR'] = _PDF_DIR
+
+import psycopg2
+import psycopg2.extensions
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db as dbmod          # noqa: E402
+import metrics              # noqa: E402
+import migrate              # noqa: E402
+from bench import generate  # noqa: E402
+
+ADMIN_URL = os.getenv('BENCH_DATABASE_URL', 'postgresql://postgres@localhost/postgres')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def total_queries():
+    return sum(count for _, _, count in metrics.registry.snapshot('db_query_duration_seconds').values())
+
+# ---------------------------------------------------------
+# throwaway database
+# ---------------------------------------------------------
+def create_database(name):
+    conn = psycopg2.connect(ADMIN_URL)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS {name}')
+        cur.execute(f'CREATE DATABASE {name}')
+    conn.close()
+    return psycopg2.extensions.make_dsn(ADMIN_URL, dbname=name)
+
+def drop_database(name):
+    dbmod.close_pool()
+    conn = psycopg2.connect(ADMIN_URL)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        # FORCE (PostgreSQL 13+) ends sessions still connected to it
+        cur.execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+    conn.close()
+
+# ---------------------------------------------------------
+# scenario runner
+# ---------------------------------------------------------
+class Bench:
+    def __init__(self, client, repeat):
+        self.client = client
+        self.repeat = repeat
+        self.results = {}
+
+    # call(i) performs one request and returns the response;
+    # setup(i) runs untimed before each call
+    def measure(self, name, call, setup=None, n=None):
+        n = n or self.repeat
+        timings, queries, statuses = [], [], {}
+        for i in range(n):
+            if setup:
+                setup(i)
+            q0 = total_queries()
+            t0 = time.perf_counter()
+            resp = call(i)
+            resp.get_data()   # drain streamed bodies inside the timing
+            timings.append(time.perf_counter() - t0)
+            queries.append(total_queries() - q0)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+        # one extra traced call for peak Python memory
+        if setup:
+            setup(n)
+        tracemalloc.start()
+        call(n).get_data()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        timings.sort()
+        self.results[name] = {
+            'n': n,
+            'mean_ms': round(sum(timings) / n * 1000, 3),
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p90_ms': round(percentile(timings, 90) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'p99_ms': round(percentile(timings, 99) * 1000, 3),
+            'max_ms': round(timings[-1] * 1000, 3),
+            'queries_per_call': round(sum(queries) / n, 2),
+            'peak_python_mem_kb': round(peak / 1024, 1),
+            'status_codes': {str(k): v for k, v in statuses.items()},
+        }
+        print(f"  {name:<32} p50={self.results[name]['p50_ms']:>9.2f}ms  p95={self.results[name]['p95_ms']:>9.2f}ms  "
+              f"queries={self.results[name]['queries_per_call']:>7}  peak={self.results[name]['peak_python_mem_kb']:>9}KB", file=sys.stderr)
+
+
+def run_scenarios(app, repeat):
+    from api import cache, seat_index
+    client = app.test_client()
+    bench = Bench(client, repeat)
+
+    exams = dbmod.fetchall('SELECT e.Exam_id, e.day, (SELECT COUNT(*) FROM registration r WHERE r.program=e.program AND r.course=e.code_course) AS regs FROM exam e ORDER BY regs DESC')
+    # largest exams first: the interesting ones for seating cost
+    sample = [e['exam_id'] for e in exams[:max(repeat, 1) + 1]]
+    busiest_day = exams[0]['day']
+
+    def unassign_all(_):
+        dbmod.execute('DELETE FROM student_legan')
+        dbmod.execute('UPDATE exam SET assigned=0')
+
+    def drop_some_seats(i):
+        # simulate late registrations: free ~5% of one exam's seats
+        exam_id = sample[i % len(sample)]
+        dbmod.execute('DELETE FROM student_legan WHERE student_legan_id IN (SELECT student_legan_id FROM student_legan WHERE exam=%s ORDER BY random() LIMIT GREATEST(1, (SELECT COUNT(*) FROM student_legan WHERE exam=%s) / 20))', (exam_id, exam_id))
+
+    def cold(_):
+        cache.response_cache.clear()
+        shutil.rmtree(_PDF_DIR, ignore_errors=True)
+
+    # --- seating ---
+    bench.measure('assign_course', lambda i: client.post(f'/api/v1/assign/{sample[i % len(sample)]}'), setup=unassign_all)
+    bench.measure('assign_batch_day', lambda i: client.post(f'/api/v1/assign/batch?day={busiest_day}'), setup=unassign_all)
+    bench.measure('assign_batch_day_pack', lambda i: client.post(f'/api/v1/assign/batch?day={busiest_day}&strategy=pack'), setup=unassign_all)
+    bench.measure('plan_batch_pack_dry_run', lambda i: client.post('/api/v1/assign/batch?strategy=pack&dry_run=1'), setup=unassign_all)
+    client.post('/api/v1/assign/batch')   # seat everything for the read scenarios
+    bench.measure('reassign_new_students', lambda i: client.post(f'/api/v1/reassign/{sample[i % len(sample)]}'), setup=drop_some_seats)
+    bench.measure('unassign_course', lambda i: client.post(f'/api/v1/unassign/{sample[i % len(sample)]}'),
+                  setup=lambda i: client.post(f'/api/v1/assign/{sample[i % len(sample)]}'))
+    client.post('/api/v1/assign/batch')
+
+    # --- listings / print ---
+    bench.measure('students_legans_cold', lambda i: client.get('/api/v1/students-legans'), setup=cold)
+    bench.measure('students_legans_warm', lambda i: client.get('/api/v1/students-legans'))
+    bench.measure('students_legans_day_cold', lambda i: client.get(f'/api/v1/students-legans?day={busiest_day}'), setup=cold)
+    bench.measure('print_json_day', lambda i: client.get(f'/api/v1/students-legans/print?day={busiest_day}'))
+    bench.measure('print_json_day_stream', lambda i: client.get(f'/api/v1/students-legans/print?day={busiest_day}&stream=1'))
+    bench.measure('print_pdf_exam_cold', lambda i: client.get(f'/api/v1/students-legans/print/pdf?exam_id={sample[i % len(sample)]}'), setup=cold)
+    some_students = [r['student_id'] for r in dbmod.fetchall('SELECT student_id FROM student_legan ORDER BY student_Legan_id LIMIT 200')]
+    if some_students:
+        bench.measure('student_seats_cold', lambda i: client.get(f'/api/v1/students/{some_students[i % len(some_students)]}/seats?all=1'),
+                      setup=lambda i: seat_index.seat_cache.clear())
+        bench.measure('student_seats_warm', lambda i: client.get(f'/api/v1/students/{some_students[0]}/seats?all=1'))
+    bench.measure('print_pdf_exam_cached', lambda i: client.get(f'/api/v1/students-legans/print/pdf?exam_id={sample[0]}'))
+    return bench.results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seating benchmark')
+    parser.add_argument('--scale', default='1k', help='1k, 20k, 100k or a registration count')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='write JSON results here (default: stdout)')
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark database')
+    args = parser.parse_args(argv)
+
+    registrations = generate.scale_to_registrations(args.scale)
+    name = f'exam_bench_{os.getpid()}'
+    print(f'Creating database {name} ({registrations} registrations)...', file=sys.stderr)
+    dbmod.DATABASE_URL = create_database(name)
+    try:
+        migrate.run_migrations(log=lambda *_: None)
+        dataset = generate.generate(registrations, seed=args.seed)
+        t0 = time.perf_counter()
+        with dbmod.get_cursor(True) as (conn, cur):
+            generate.load(cur, dataset)
+        load_s = time.perf_counter() - t0
+
+        from api import create_app
+        app = create_app()
+        metrics.registry.reset()
+        results = run_scenarios(app, args.repeat)
+
+        server_version = dbmod.fetchall('SHOW server_version')[0]['server_version']
+        report = {
+            'meta': {
+                'scale': args.scale,
+                'registrations': registrations,
+                'rows': {t: len(rows) for t, (_, rows) in dataset.items()},
+                'seed': args.seed,
+                'repeat': args.repeat,
+                'load_seconds': round(load_s, 3),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'postgres': server_version,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            },
+            'scenarios': results,
+        }
+    finally:
+        if not args.keep:
+            drop_database(name)
+        shutil.rmtree(_PDF_DIR, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as fh:
+            fh.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# ===== FILE: bench/startup.py =====
+# Cold-start benchmark: time from launching gunicorn until the first
+# responses, for the plain command and for gunicorn.conf.py.
+#   python -m bench.startup --runs 5 --out bench-startup.json
+# Each run starts a fresh server on a free port, polls --ready-path until
+# it answers, then times one request to each --path (the first DB and
+# listing requests pay for lazy imports and pool connects). Also records
+# the import time of the app module alone. Uses DATABASE_URL from the
+# environment; run against a database that has been migrated. For a
+# before/after comparison of code changes run it on both revisions and
+# diff the JSON files.
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGS = {
+    'plain': ['gunicorn', 'app:app'],
+    'tuned': ['gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def get(url, timeout=30):
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return time.perf_counter() - t0, status
+
+def import_seconds():
+    code = 'import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)'
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, text=True, env=dict(os.environ, AUTO_MIGRATE='0'))
+    return float(out.strip().splitlines()[-1])
+
+def one_run(cmd, ready_path, paths, ready_timeout):
+    port = free_port()
+    env = dict(os.environ, AUTO_MIGRATE='0', PORT=str(port))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd[:-1] + ['--bind', f'127.0.0.1:{port}'] + cmd[-1:], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f'http://127.0.0.1:{port}'
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{' '.join(cmd)} exited with {proc.returncode}")
+            if time.perf_counter() - t0 > ready_timeout:
+                raise RuntimeError(f"{' '.join(cmd)} did not answer within {ready_timeout}s")
+            try:
+                get(base + ready_path, timeout=1)
+                break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.02)
+        result = {'ready_s': time.perf_counter() - t0, 'first': {}}
+        for path in paths:
+            secs, status = get(base + path)
+            result['first'][path] = {'ms': round(secs * 1000, 2), 'status': status}
+        return result
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time-to-first-response benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--configs', default='plain,tuned', help=f"comma list of {', '.join(CONFIGS)}")
+    parser.add_argument('--ready-path', default='/api/hello')
+    parser.add_argument('--path', action='append', dest='paths',
+                        help='request timed after the server is up (repeatable; default: rooms and students-legans)')
+    parser.add_argument('--ready-timeout', type=float, default=60)
+    parser.add_argument('--out', help='write JSON results here (default: stdout)')
+    args = parser.parse_args(argv)
+    paths = args.paths or ['/api/v1/rooms', '/api/v1/students-legans?limit=50']
+
+    imports = [import_seconds() for _ in range(args.runs)]
+    report = {
+        'meta': {'runs': args.runs, 'python': platform.python_version(), 'cpus': os.cpu_count(),
+                 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())},
+        'import_app_ms': round(statistics.median(imports) * 1000, 2),
+        'configs': {},
+    }
+    print(f"  import app: {report['import_app_ms']:.1f}ms", file=sys.stderr)
+    for name in args.configs.split(','):
+        runs = [one_run(CONFIGS[name], args.ready_path, paths, args.ready_timeout) for _ in range(args.runs)]
+        summary = {'ready_ms': round(statistics.median(r['ready_s'] for r in runs) * 1000, 2), 'first_request_ms': {}}
+        for path in paths:
+            summary['first_request_ms'][path] = round(statistics.median(r['first'][path]['ms'] for r in runs), 2)
+            summary.setdefault('status', {})[path] = runs[-1]['first'][path]['status']
+        report['configs'][name] = summary
+        print(f"  {name:<6} ready={summary['ready_ms']:>8.1f}ms  " +
+              '  '.join(f'{p}={ms:.1f}ms' for p, ms in summary['first_request_ms'].items()), file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as fh:
+            fh.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,60 @@
 # ===== FILE: db.py =====
 import os
+import time
+import threading
+import uuid
 import psycopg2
 import psycopg2.extras
+import psycopg2.extensions
 from contextlib import contextmanager
+import metrics
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
+
+# Pool tuning (per worker process)
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+# ---------------------------------------------------------
+# cursors that report every statement to metrics
+# (latency, row count, fingerprint, slow-query log)
+# ---------------------------------------------------------
+class _Instrumented:
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            metrics.record_query(query, time.perf_counter() - start, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            metrics.record_query(query, time.perf_counter() - start, self.rowcount)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            metrics.record_query(sql, time.perf_counter() - start, self.rowcount)
+
+class InstrumentedCursor(_Instrumented, psycopg2.extensions.cursor):
+    pass
+
+class InstrumentedDictCursor(_Instrumented, psycopg2.extras.RealDictCursor):
+    pass
 
 # ---------------------------------------------------------
 # Create a new DB connection
@@ -12,38 +62,268 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 def get_connection():
     if not DATABASE_URL:
         raise RuntimeError("DATABASE_URL is not set in environment.")
-    
+
     return psycopg2.connect(
         DATABASE_URL,
-        sslmode="require"
+        sslmode=DB_SSLMODE,
+        cursor_factory=InstrumentedCursor
     )
 
+# ---------------------------------------------------------
+# ConnectionPool
+# thread-safe pool of reusable connections. Idle connections
+# are pinged before reuse once they have been idle for
+# POOL_PING_AFTER seconds, and recycled after POOL_MAX_LIFETIME.
+# Returned connections are rolled back if left inside a
+# transaction, and discarded if broken.
+# ---------------------------------------------------------
+class ConnectionPool:
+    def __init__(self, connect=get_connection, minconn=POOL_MIN, maxconn=POOL_MAX,
+                 timeout=POOL_TIMEOUT, ping_after=POOL_PING_AFTER, max_lifetime=POOL_MAX_LIFETIME):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError("Invalid pool size: min=%s max=%s" % (minconn, maxconn))
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.max_lifetime = max_lifetime
+        self._cond = threading.Condition()
+        self._idle = []          # [(conn, created_at, last_used)]
+        self._in_use = {}        # id(conn) -> created_at
+        self._waiting = 0
+        self._opening = 0        # slots reserved by connects in progress
+        self._returning = 0      # slots held by connections being reset in putconn
+        self._closed = False
+        self._counters = {'checkouts': 0, 'created': 0, 'discarded': 0, 'timeouts': 0, 'pings_failed': 0}
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self._counters['created'] += 1
+        return conn
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._opening + self._returning
+
+    def fill(self):
+        # open connections up to minconn (used for warm-up), reserving
+        # one slot at a time so a failed connect gives its slot back
+        while True:
+            with self._cond:
+                if self._closed or self._size() >= self.minconn:
+                    return
+                self._opening += 1
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+            now = time.monotonic()
+            with self._cond:
+                self._opening -= 1
+                self._idle.append((conn, now, now))
+                self._cond.notify()
+
+    def _usable(self, conn, created_at, last_used):
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if self.ping_after is not None and now - last_used > self.ping_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                with self._cond:
+                    self._counters['pings_failed'] += 1
+                return False
+        return True
+
+    def _discard(self, conn):
+        self._counters['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            candidate = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed.")
+                    if self._idle:
+                        candidate = self._idle.pop()
+                        self._in_use[id(candidate[0])] = candidate[1]
+                        break
+                    if len(self._in_use) + self._opening + self._returning < self.maxconn:
+                        self._opening += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeout("Timed out after %.1fs waiting for a DB connection (max=%s)." % (timeout, self.maxconn))
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            # validate / connect outside the lock so a slow ping or
+            # TLS handshake does not block other threads
+            if candidate is not None:
+                conn, created_at, last_used = candidate
+                if self._usable(conn, created_at, last_used):
+                    with self._cond:
+                        self._counters['checkouts'] += 1
+                    return conn
+                with self._cond:
+                    self._in_use.pop(id(conn), None)
+                    self._discard(conn)
+                    self._cond.notify()
+                continue
+
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._opening -= 1
+                self._in_use[id(conn)] = time.monotonic()
+                self._counters['checkouts'] += 1
+            return conn
+
+    def putconn(self, conn, discard=False):
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), None)
+            if created_at is not None:
+                # keep the slot reserved while the connection is reset
+                self._returning += 1
+        if created_at is None:
+            # not ours (e.g. the pool was reset after a fork): close it
+            # rather than leak the socket
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return
+        # reset outside the lock so a slow rollback does not stall checkouts
+        if not discard and not conn.closed:
+            try:
+                status = conn.get_transaction_status()
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception:
+                discard = True
+        with self._cond:
+            self._returning -= 1
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn, _, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return dict(self._counters, size=self._size(), idle=len(self._idle),
+                        in_use=len(self._in_use), waiting=self._waiting, min=self.minconn, max=self.maxconn)
+
+
+# ---------------------------------------------------------
+# one pool per worker process (re-created after fork, e.g.
+# gunicorn --preload; inherited sockets are abandoned, not
+# closed, so the parent's sessions are left intact)
+# ---------------------------------------------------------
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool()
+                _pool_pid = pid
+    return _pool
+
+def close_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _pool_pid = None
+
+def pool_stats():
+    return get_pool().stats()
+
+@contextmanager
+def connection():
+    pool = get_pool()
+    start = time.perf_counter()
+    conn = pool.getconn()
+    metrics.record_acquire(time.perf_counter() - start)
+    try:
+        yield conn
+    finally:
+        # broken connections are dropped instead of going back to the pool
+        pool.putconn(conn, discard=bool(conn.closed))
+
 # ---------------------------------------------------------
 # fetchall(query, params)  → returns list of dictionaries
 # ---------------------------------------------------------
 def fetchall(query, params=None):
-    conn = get_connection()
-    try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        cur.execute(query, params or ())
-        rows = cur.fetchall()
+    with connection() as conn:
+        with conn.cursor(cursor_factory=InstrumentedDictCursor) as cur:
+            cur.execute(query, params or ())
+            rows = cur.fetchall()
         return rows
-    finally:
-        cur.close()
-        conn.close()
 
 # ---------------------------------------------------------
 # execute(query, params)  → executes INSERT / UPDATE / DELETE
 # ---------------------------------------------------------
 def execute(query, params=None):
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(query, params or ())
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params or ())
         conn.commit()
-    finally:
-        cur.close()
-        conn.close()
+
+# ---------------------------------------------------------
+# execute_returning(query, params) → commits and returns rows
+# (INSERT / UPDATE / DELETE ... RETURNING)
+# ---------------------------------------------------------
+def execute_returning(query, params=None):
+    with connection() as conn:
+        with conn.cursor(cursor_factory=InstrumentedDictCursor) as cur:
+            cur.execute(query, params or ())
+            rows = cur.fetchall()
+        conn.commit()
+        return rows
 
 # ---------------------------------------------------------
 # get_cursor(commit_mode)
@@ -53,15 +333,40 @@ def execute(query, params=None):
 # ---------------------------------------------------------
 @contextmanager
 def get_cursor(commit_mode=True):
-    conn = get_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    try:
-        yield conn, cur
-        if commit_mode:
-            conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        cur.close()
-        conn.close()
+    with connection() as conn:
+        cur = conn.cursor(cursor_factory=InstrumentedDictCursor)
+        try:
+            yield conn, cur
+            if commit_mode:
+                conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+# ---------------------------------------------------------
+# stream(query, params, chunk_size) → yields dict rows from a
+# server-side (named) cursor, chunk_size rows per round trip,
+# so large result sets never sit in memory all at once
+# ---------------------------------------------------------
+STREAM_CHUNK_SIZE = int(os.getenv("DB_STREAM_CHUNK_SIZE", "2000"))
+
+def stream(query, params=None, chunk_size=None):
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    with connection() as conn:
+        cur = conn.cursor(name="stream_%s" % uuid.uuid4().hex, cursor_factory=InstrumentedDictCursor)
+        cur.itersize = chunk_size
+        try:
+            cur.execute(query, params or ())
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
@@ -0,0 +1,93 @@
+# ===== FILE: gunicorn.conf.py =====
+# gunicorn -c gunicorn.conf.py app:app
+# The app is imported once in the master (preload) and forked, so
+# workers start without re-importing Flask / psycopg2 / the routes.
+# gthread workers serve several requests per process (seating writes
+# are serialized per exam by advisory locks, see api/seating.py).
+# After the fork each worker opens its DB pool (DB_POOL_MIN connections)
+# and starts its job threads, so the first request does not pay for the
+# TCP/TLS handshake. Heavy modules (pandas, numpy, reportlab) stay lazy.
+#
+# Sizing (WEB_CONCURRENCY overrides the worker count):
+#   - workers default to 2*CPU+1 (CPUs this process may run on), at most 8;
+#     WEB_CONCURRENCY=1 opts into a single worker
+#   - the response cache is per worker, so with more than one worker
+#     RESPONSE_CACHE_SHARED defaults to 1 (generation numbers in Postgres
+#     expire the other workers' entries); setting it to 0 keeps them
+#     stale for up to RESPONSE_CACHE_TTL
+#   - every worker may open DB_POOL_MAX connections (requests and job
+#     threads share the pool); workers are capped so that
+#     workers * DB_POOL_MAX stays within DB_CONNECTION_BUDGET
+#   - every worker has its own PDF process pool; PDF_WORKERS defaults to
+#     the CPUs left per worker (at most 2)
+import os
+from dotenv import load_dotenv
+
+# db / api read their settings at import; with GUNICORN_PRELOAD=0 the
+# workers import them before create_app() would load .env
+load_dotenv()
+
+
+def usable_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+cpus = usable_cpus()
+pool_max = int(os.getenv('DB_POOL_MAX', '10'))
+job_workers = int(os.getenv('JOB_WORKERS', '2'))
+connection_budget = int(os.getenv('DB_CONNECTION_BUDGET', '80'))
+max_workers = max(1, connection_budget // max(pool_max, 1))
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+worker_class = 'gthread'
+if os.getenv('WEB_CONCURRENCY'):
+    workers = int(os.environ['WEB_CONCURRENCY'])
+else:
+    workers = min(cpus * 2 + 1, 8, max_workers)
+# keep request threads + job threads <= DB_POOL_MAX so a request never waits for a connection
+threads = int(os.getenv('GUNICORN_THREADS', str(max(1, min(4, pool_max - job_workers)))))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# recycle workers now and then (spread out so they do not restart together)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+accesslog = os.getenv('GUNICORN_ACCESSLOG') or None
+
+# read by api/cache.py / api/pdf.py when the app is imported (after this file)
+if workers > 1 and not os.getenv('RESPONSE_CACHE_SHARED'):
+    os.environ['RESPONSE_CACHE_SHARED'] = '1'
+shared_cache = os.getenv('RESPONSE_CACHE_SHARED') == '1'
+os.environ.setdefault('PDF_WORKERS', str(max(1, min(2, cpus // workers))))
+
+
+def when_ready(server):
+    if workers > 1 and not shared_cache:
+        server.log.warning('%d workers with RESPONSE_CACHE_SHARED=0: cached listings may be stale '
+                           'in other workers for up to RESPONSE_CACHE_TTL seconds', workers)
+    if workers * pool_max > connection_budget:
+        server.log.warning('%d workers x DB_POOL_MAX=%d exceeds DB_CONNECTION_BUDGET=%d',
+                           workers, pool_max, connection_budget)
+    # connections the master opened while preloading (e.g. AUTO_MIGRATE=1)
+    # must not be inherited by the forked workers
+    import db as dbmod
+    dbmod.close_pool()
+
+
+def post_fork(server, worker):
+    import db as dbmod
+    try:
+        dbmod.get_pool().fill()
+    except Exception as e:
+        # the pool connects lazily on the first request instead
+        server.log.warning('DB pool warm-up failed: %s', e)
+    from api import jobs
+    jobs.ensure_started()
+
+
+def worker_exit(server, worker):
+    import db as dbmod
+    dbmod.close_pool()
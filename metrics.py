@@ -0,0 +1,188 @@
+# ===== FILE: metrics.py =====
+# In-process metrics for the hot paths, rendered in the Prometheus text
+# format by /api/v1/metrics:
+#   http_request_duration_seconds{route,method,status}
+#   http_request_queries{route,method}        queries run per request
+#   db_query_duration_seconds{query}          per statement fingerprint
+#   db_query_rows{query}
+#   db_pool_acquire_seconds                   connection checkout latency
+# Statements slower than SLOW_QUERY_MS are logged (normalized text only,
+# never the parameters). Each worker process keeps its own registry.
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import contextvars
+from functools import lru_cache
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))
+METRICS_ENABLED = os.getenv('METRICS', '1') == '1'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+slow_log = logging.getLogger('db.slow')
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}   # name -> {labels tuple: Histogram}
+        self._help = {}
+        self._buckets = {}
+        self._statements = {}   # fingerprint id -> normalized text
+
+    def histogram(self, name, help_text, buckets):
+        self._help[name] = help_text
+        self._buckets[name] = buckets
+        self._histograms.setdefault(name, {})
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            series = self._histograms[name]
+            h = series.get(labels)
+            if h is None:
+                h = series[labels] = Histogram(self._buckets[name])
+            h.observe(value)
+
+    def note_statement(self, fid, text):
+        if fid not in self._statements:
+            with self._lock:
+                self._statements[fid] = text
+
+    def reset(self):
+        with self._lock:
+            for series in self._histograms.values():
+                series.clear()
+            self._statements.clear()
+
+    def snapshot(self, name):
+        with self._lock:
+            return {labels: (list(h.counts), h.sum, h.count) for labels, h in self._histograms[name].items()}
+
+    def render(self, extra_gauges=None):
+        out = []
+        with self._lock:
+            for name, series in self._histograms.items():
+                out.append(f'# HELP {name} {self._help[name]}')
+                out.append(f'# TYPE {name} histogram')
+                for labels, h in sorted(series.items()):
+                    base = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                    sep = ',' if base else ''
+                    cumulative = 0
+                    for bound, n in zip(h.buckets, h.counts):
+                        cumulative += n
+                        out.append(f'{name}_bucket{{{base}{sep}le="{bound}"}} {cumulative}')
+                    out.append(f'{name}_bucket{{{base}{sep}le="+Inf"}} {h.count}')
+                    out.append(f'{name}_sum{{{base}}} {h.sum:.6f}')
+                    out.append(f'{name}_count{{{base}}} {h.count}')
+            out.append('# HELP db_statement_info Normalized text of each query fingerprint')
+            out.append('# TYPE db_statement_info gauge')
+            for fid, text in sorted(self._statements.items()):
+                out.append(f'db_statement_info{{query="{fid}",statement="{_escape(text)}"}} 1')
+        for name, (help_text, values) in (extra_gauges or {}).items():
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} gauge')
+            for labels, value in values:
+                base = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                out.append(f'{name}{{{base}}} {value}')
+        return '\n'.join(out) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+registry.histogram('http_request_duration_seconds', 'Request latency by route', LATENCY_BUCKETS)
+registry.histogram('http_request_queries', 'SQL statements executed per request', COUNT_BUCKETS)
+registry.histogram('db_query_duration_seconds', 'SQL statement latency by fingerprint', LATENCY_BUCKETS)
+registry.histogram('db_query_rows', 'Rows returned / affected by fingerprint', ROW_BUCKETS)
+registry.histogram('db_pool_acquire_seconds', 'Time spent waiting for a pooled connection', LATENCY_BUCKETS)
+
+# ---------------------------------------------------------
+# statement fingerprints: literals and parameters become ?,
+# whitespace is collapsed, long IN / VALUES lists fold to one ?
+# ---------------------------------------------------------
+_COMMENT_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAM_RE = re.compile(r'%\(\w+\)s|%s')
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    text = _COMMENT_RE.sub(' ', sql)
+    text = _STRING_RE.sub('?', text)
+    text = _PARAM_RE.sub('?', text)
+    text = _NUMBER_RE.sub('?', text)
+    text = _LIST_RE.sub('(?)', text)
+    text = _SPACE_RE.sub(' ', text).strip()
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12], text[:300]
+
+# ---------------------------------------------------------
+# per-request state (query count / DB time)
+# ---------------------------------------------------------
+_request = contextvars.ContextVar('metrics_request', default=None)
+
+def start_request():
+    if METRICS_ENABLED:
+        _request.set({'start': time.perf_counter(), 'queries': 0, 'db_time': 0.0})
+
+def finish_request(route, method, status):
+    state = _request.get()
+    if state is None:
+        return None
+    _request.set(None)
+    elapsed = time.perf_counter() - state['start']
+    registry.observe('http_request_duration_seconds', (('route', route), ('method', method), ('status', str(status))), elapsed)
+    registry.observe('http_request_queries', (('route', route), ('method', method)), state['queries'])
+    return dict(state, elapsed=elapsed)
+
+def record_query(sql, seconds, rows):
+    if not METRICS_ENABLED:
+        return
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    elif not isinstance(sql, str):
+        sql = str(sql)
+    fid, text = fingerprint(sql)
+    registry.note_statement(fid, text)
+    labels = (('query', fid),)
+    registry.observe('db_query_duration_seconds', labels, seconds)
+    registry.observe('db_query_rows', labels, max(rows or 0, 0))
+    state = _request.get()
+    if state is not None:
+        state['queries'] += 1
+        state['db_time'] += seconds
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_log.warning('slow query %.1fms rows=%s [%s] %s', seconds * 1000, rows, fid, text)
+
+def record_acquire(seconds):
+    if METRICS_ENABLED:
+        registry.observe('db_pool_acquire_seconds', (), seconds)
+
+def render(extra_gauges=None):
+    return registry.render(extra_gauges)
@@ -0,0 +1,105 @@
+# ===== FILE: migrate.py =====
+# Versioned schema migrations.
+#   python migrate.py           → apply schema.sql + pending migrations
+#   python migrate.py --status  → list applied / pending migrations
+# Migrations live in migrations/NNNN_name.sql and each one runs in its
+# own transaction. A Postgres advisory lock makes concurrent runs (e.g.
+# several workers starting with AUTO_MIGRATE=1) wait for each other.
+import os
+import re
+import sys
+import db as dbmod
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(BASE_DIR, 'migrations')
+SCHEMA_FILE = os.path.join(BASE_DIR, 'schema.sql')
+MIGRATION_LOCK_KEY = 72630001
+FILENAME_RE = re.compile(r'^(\d{4})_([\w-]+)\.sql$')
+
+# ---------------------------------------------------------
+# available() → [(version, name, path)] sorted by version
+# ---------------------------------------------------------
+def available():
+    found = []
+    for fname in os.listdir(MIGRATIONS_DIR):
+        m = FILENAME_RE.match(fname)
+        if m:
+            found.append((int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, fname)))
+    found.sort()
+    versions = [v for v, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version in %s" % MIGRATIONS_DIR)
+    return found
+
+def _read(path):
+    with open(path, encoding='utf-8') as fh:
+        return fh.read()
+
+def _ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255),
+                applied_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+    conn.commit()
+
+def applied_versions(conn):
+    with conn.cursor() as cur:
+        cur.execute('SELECT version FROM schema_migrations')
+        return {r[0] for r in cur.fetchall()}
+
+# ---------------------------------------------------------
+# run_migrations() → list of (version, name) applied now
+# ---------------------------------------------------------
+def run_migrations(log=print):
+    done = []
+    with dbmod.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_KEY,))
+        conn.commit()
+        try:
+            # baseline tables (idempotent CREATE TABLE IF NOT EXISTS)
+            with conn.cursor() as cur:
+                cur.execute(_read(SCHEMA_FILE))
+            conn.commit()
+            _ensure_table(conn)
+            have = applied_versions(conn)
+            for version, name, path in available():
+                if version in have:
+                    continue
+                log("Applying migration %04d_%s" % (version, name))
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(_read(path))
+                        cur.execute('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)', (version, name))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                done.append((version, name))
+        finally:
+            with conn.cursor() as cur:
+                cur.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_KEY,))
+            conn.commit()
+    return done
+
+def status():
+    with dbmod.connection() as conn:
+        _ensure_table(conn)
+        have = applied_versions(conn)
+    return [(version, name, version in have) for version, name, _ in available()]
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    load_dotenv()
+    dbmod.DATABASE_URL = os.getenv('DATABASE_URL')
+    if '--status' in sys.argv[1:]:
+        for version, name, is_applied in status():
+            print("%04d_%s  %s" % (version, name, 'applied' if is_applied else 'pending'))
+    else:
+        applied_now = run_migrations()
+        print("Applied %d migration(s)." % len(applied_now))
@@ -0,0 +1,11 @@
+-- 0001_hot_path_indexes.sql
+-- indexes for the filters used by the seating and listing endpoints
+
+CREATE INDEX IF NOT EXISTS student_legan_exam_legan_idx ON student_legan (exam, legan_id);
+CREATE INDEX IF NOT EXISTS registration_program_course_idx ON registration (program, course);
+CREATE INDEX IF NOT EXISTS registration_student_id_idx ON registration (student_ID);
+CREATE INDEX IF NOT EXISTS legan_program_level_idx ON legan (program, level);
+CREATE INDEX IF NOT EXISTS exam_program_level_idx ON exam (program, level);
+CREATE INDEX IF NOT EXISTS exam_code_course_idx ON exam (code_course);
+CREATE INDEX IF NOT EXISTS exam_slot_idx ON exam (day, period_id, date);
+CREATE INDEX IF NOT EXISTS exam_type_idx ON exam (type);
@@ -0,0 +1,29 @@
+-- 0002_exam_sort_keys.sql
+-- stored sort keys so listings no longer parse day / period_id per row.
+-- unknown days and unparseable periods sort last, as NULLs did before.
+
+ALTER TABLE exam ADD COLUMN IF NOT EXISTS day_order SMALLINT GENERATED ALWAYS AS (
+    CASE day
+        WHEN 'Saturday' THEN 1 WHEN 'Sunday' THEN 2 WHEN 'Monday' THEN 3 WHEN 'Tuesday' THEN 4
+        WHEN 'Wednesday' THEN 5 WHEN 'Thursday' THEN 6 WHEN 'Friday' THEN 7
+        ELSE 8
+    END
+) STORED;
+
+-- start of period_id ("HH:MM-HH:MM") in minutes; hours 1-7 are PM
+ALTER TABLE exam ADD COLUMN IF NOT EXISTS period_start_minutes INTEGER GENERATED ALWAYS AS (
+    CASE
+        WHEN period_id ~ '^\s*[0-9]{1,2}:[0-9]{2}' THEN
+            (
+                CASE
+                    WHEN CAST(substring(period_id FROM '^\s*([0-9]{1,2}):') AS INTEGER) BETWEEN 1 AND 7
+                        THEN CAST(substring(period_id FROM '^\s*([0-9]{1,2}):') AS INTEGER) + 12
+                    ELSE CAST(substring(period_id FROM '^\s*([0-9]{1,2}):') AS INTEGER)
+                END
+            ) * 60
+            + CAST(substring(period_id FROM '^\s*[0-9]{1,2}:([0-9]{2})') AS INTEGER)
+        ELSE 9999
+    END
+) STORED;
+
+CREATE INDEX IF NOT EXISTS exam_sort_idx ON exam (day_order, period_start_minutes, Exam_id);
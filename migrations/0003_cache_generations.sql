@@ -0,0 +1,9 @@
+-- 0003_cache_generations.sql
+-- per-namespace generation counters for the shared response cache
+-- (RESPONSE_CACHE_SHARED=1, see api/cache.py)
+
+CREATE TABLE IF NOT EXISTS cache_generations (
+    namespace VARCHAR(64) PRIMARY KEY,
+    generation BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
@@ -0,0 +1,5 @@
+-- 0005_rooms_keyset.sql
+-- keyset pagination of /api/v1/rooms (?limit=&cursor=) walks
+-- (COALESCE(floor, ''), room_id)
+
+CREATE INDEX IF NOT EXISTS rooms_floor_keyset_idx ON rooms ((COALESCE(floor, '')), room_id);
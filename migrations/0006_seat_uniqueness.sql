@@ -0,0 +1,28 @@
+-- 0006_seat_uniqueness.sql
+-- one seat per student per exam. Concurrent assigns used to be able to
+-- seat a student twice; the extra rows (all but the earliest) are removed
+-- and logged to history before the unique index is built.
+
+WITH dup AS (
+    DELETE FROM student_legan a
+    USING student_legan b
+    WHERE a.exam = b.exam AND a.student_id = b.student_id
+      AND a.student_Legan_id > b.student_Legan_id
+    RETURNING a.legan_id, a.student_id, a.exam
+)
+INSERT INTO student_legan_history (legan_id, student_id, exam_id, action)
+SELECT legan_id, student_id, exam, 'DEDUPLICATED' FROM dup;
+
+CREATE UNIQUE INDEX IF NOT EXISTS student_legan_exam_student_key ON student_legan (exam, student_id);
+
+-- responses of mutation requests sent with an Idempotency-Key header
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    status_code INTEGER,
+    body TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (key, endpoint)
+);
+CREATE INDEX IF NOT EXISTS idempotency_keys_created_idx ON idempotency_keys (created_at);
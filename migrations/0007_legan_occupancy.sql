@@ -0,0 +1,87 @@
+-- 0007_legan_occupancy.sql
+-- seats used per (exam, legan), kept in step with student_legan by
+-- statement-level triggers (transition tables, so a bulk insert or
+-- delete updates each pair once). last_row is the newest student_legan
+-- row written to the legan, used by reassign to continue where the last
+-- assignment stopped.
+
+CREATE TABLE IF NOT EXISTS legan_occupancy (
+    exam INTEGER NOT NULL,
+    legan_id INTEGER NOT NULL,
+    used INTEGER NOT NULL,
+    last_row INTEGER,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (exam, legan_id)
+);
+CREATE INDEX IF NOT EXISTS legan_occupancy_legan_idx ON legan_occupancy (legan_id);
+
+CREATE OR REPLACE FUNCTION legan_occupancy_add() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO legan_occupancy AS o (exam, legan_id, used, last_row, updated_at)
+    SELECT exam, legan_id, COUNT(*), MAX(student_Legan_id), NOW()
+    FROM new_rows WHERE exam IS NOT NULL AND legan_id IS NOT NULL
+    GROUP BY exam, legan_id
+    ON CONFLICT (exam, legan_id) DO UPDATE
+        SET used = o.used + EXCLUDED.used,
+            last_row = GREATEST(o.last_row, EXCLUDED.last_row),
+            updated_at = NOW();
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION legan_occupancy_remove() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE legan_occupancy o SET used = o.used - d.n, updated_at = NOW()
+    FROM (SELECT exam, legan_id, COUNT(*) AS n FROM old_rows GROUP BY exam, legan_id) d
+    WHERE o.exam = d.exam AND o.legan_id = d.legan_id;
+    DELETE FROM legan_occupancy o
+    USING (SELECT DISTINCT exam, legan_id FROM old_rows) d
+    WHERE o.exam = d.exam AND o.legan_id = d.legan_id AND o.used <= 0;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION legan_occupancy_move() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE legan_occupancy o SET used = o.used - d.n, updated_at = NOW()
+    FROM (SELECT exam, legan_id, COUNT(*) AS n FROM old_rows GROUP BY exam, legan_id) d
+    WHERE o.exam = d.exam AND o.legan_id = d.legan_id;
+    INSERT INTO legan_occupancy AS o (exam, legan_id, used, last_row, updated_at)
+    SELECT exam, legan_id, COUNT(*), MAX(student_Legan_id), NOW()
+    FROM new_rows WHERE exam IS NOT NULL AND legan_id IS NOT NULL
+    GROUP BY exam, legan_id
+    ON CONFLICT (exam, legan_id) DO UPDATE
+        SET used = o.used + EXCLUDED.used,
+            last_row = GREATEST(o.last_row, EXCLUDED.last_row),
+            updated_at = NOW();
+    DELETE FROM legan_occupancy o
+    USING (SELECT DISTINCT exam, legan_id FROM old_rows) d
+    WHERE o.exam = d.exam AND o.legan_id = d.legan_id AND o.used <= 0;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION legan_occupancy_clear() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    TRUNCATE legan_occupancy;
+    RETURN NULL;
+END $$;
+
+-- no seats may change between the backfill and the triggers going live
+LOCK TABLE student_legan IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS student_legan_occupancy_ins ON student_legan;
+DROP TRIGGER IF EXISTS student_legan_occupancy_del ON student_legan;
+DROP TRIGGER IF EXISTS student_legan_occupancy_upd ON student_legan;
+DROP TRIGGER IF EXISTS student_legan_occupancy_trunc ON student_legan;
+CREATE TRIGGER student_legan_occupancy_ins AFTER INSERT ON student_legan
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE legan_occupancy_add();
+CREATE TRIGGER student_legan_occupancy_del AFTER DELETE ON student_legan
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE legan_occupancy_remove();
+CREATE TRIGGER student_legan_occupancy_upd AFTER UPDATE ON student_legan
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE legan_occupancy_move();
+CREATE TRIGGER student_legan_occupancy_trunc AFTER TRUNCATE ON student_legan
+    FOR EACH STATEMENT EXECUTE PROCEDURE legan_occupancy_clear();
+
+TRUNCATE legan_occupancy;
+INSERT INTO legan_occupancy (exam, legan_id, used, last_row, updated_at)
+SELECT exam, legan_id, COUNT(*), MAX(student_Legan_id), NOW()
+FROM student_legan WHERE exam IS NOT NULL AND legan_id IS NOT NULL
+GROUP BY exam, legan_id;
@@ -0,0 +1,71 @@
+-- 0008_history_partitions.sql
+-- student_legan_history becomes a table partitioned by created_at, one
+-- partition per academic year (1 September → 31 August), named
+-- student_legan_history_yYYYY after the year it starts in. Rows outside
+-- every year partition land in student_legan_history_default.
+-- history_ensure_partition(ts) creates the partition for ts (moving any
+-- matching rows out of the default partition); api/history.py calls it
+-- and detaches / exports old years.
+
+CREATE OR REPLACE FUNCTION history_year_start(ts TIMESTAMP) RETURNS TIMESTAMP LANGUAGE sql IMMUTABLE AS $$
+    SELECT make_timestamp(CASE WHEN EXTRACT(MONTH FROM ts) >= 9 THEN EXTRACT(YEAR FROM ts)::int
+                               ELSE EXTRACT(YEAR FROM ts)::int - 1 END, 9, 1, 0, 0, 0)
+$$;
+
+CREATE OR REPLACE FUNCTION history_ensure_partition(ts TIMESTAMP) RETURNS TEXT LANGUAGE plpgsql AS $$
+DECLARE
+    lo TIMESTAMP := history_year_start(ts);
+    hi TIMESTAMP := lo + INTERVAL '1 year';
+    part TEXT := 'student_legan_history_y' || EXTRACT(YEAR FROM lo)::int;
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN part;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE student_legan_history INCLUDING DEFAULTS)', part);
+    EXECUTE format('WITH moved AS (DELETE FROM student_legan_history_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                   'INSERT INTO %I SELECT * FROM moved', lo, hi, part);
+    EXECUTE format('ALTER TABLE student_legan_history ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+    RETURN part;
+END $$;
+
+DO $$
+DECLARE
+    first_ts TIMESTAMP;
+    y TIMESTAMP;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'student_legan_history'::regclass) THEN
+        RETURN;
+    END IF;
+    ALTER TABLE student_legan_history RENAME TO student_legan_history_old;
+    ALTER SEQUENCE student_legan_history_id_seq OWNED BY NONE;
+
+    CREATE TABLE student_legan_history (
+        id INTEGER NOT NULL DEFAULT nextval('student_legan_history_id_seq'),
+        legan_id INTEGER,
+        student_id VARCHAR(64),
+        exam_id INTEGER,
+        action VARCHAR(32),
+        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    ALTER SEQUENCE student_legan_history_id_seq OWNED BY student_legan_history.id;
+    CREATE TABLE student_legan_history_default PARTITION OF student_legan_history DEFAULT;
+
+    -- a partition for every year that has rows, plus this year and the next
+    SELECT MIN(created_at) INTO first_ts FROM student_legan_history_old;
+    y := history_year_start(LEAST(COALESCE(first_ts, NOW()::timestamp), NOW()::timestamp));
+    WHILE y <= NOW() + INTERVAL '1 year' LOOP
+        PERFORM history_ensure_partition(y);
+        y := y + INTERVAL '1 year';
+    END LOOP;
+
+    INSERT INTO student_legan_history (id, legan_id, student_id, exam_id, action, created_at)
+    SELECT id, legan_id, student_id, exam_id, action, COALESCE(created_at, NOW())
+    FROM student_legan_history_old;
+    DROP TABLE student_legan_history_old;
+END $$;
+
+-- history lookups by exam / student, newest first
+CREATE INDEX IF NOT EXISTS student_legan_history_exam_student_idx ON student_legan_history (exam_id, student_id);
+CREATE INDEX IF NOT EXISTS student_legan_history_student_idx ON student_legan_history (student_id, created_at);
+CREATE INDEX IF NOT EXISTS student_legan_history_created_idx ON student_legan_history (created_at, id);
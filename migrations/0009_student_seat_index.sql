@@ -0,0 +1,103 @@
+-- 0009_student_seat_index.sql
+-- one row per seated (student, exam) with everything the "find my seat"
+-- lookup returns, so GET /api/v1/students/<id>/seats is a primary-key
+-- range scan instead of the print join. Statement-level triggers on
+-- student_legan (transition tables, like legan_occupancy in 0007) keep
+-- it in step inside the transaction that changes the seats; exam / legan
+-- / room detail changes go through seat_index.rebuild().
+
+CREATE TABLE IF NOT EXISTS student_seat_index (
+    student_id VARCHAR(64) NOT NULL,
+    exam_id INTEGER NOT NULL,
+    program VARCHAR(50),
+    code_course VARCHAR(50),
+    type VARCHAR(10),
+    day VARCHAR(20),
+    period_id VARCHAR(50),
+    date VARCHAR(50),
+    day_order INTEGER,
+    period_start_minutes INTEGER,
+    legan_id INTEGER,
+    legan_name VARCHAR(255),
+    room_id INTEGER,
+    room_name VARCHAR(255),
+    floor VARCHAR(50),
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (student_id, exam_id)
+);
+CREATE INDEX IF NOT EXISTS student_seat_index_exam_idx ON student_seat_index (exam_id);
+
+CREATE OR REPLACE FUNCTION seat_index_upsert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO student_seat_index (student_id, exam_id, program, code_course, type, day, period_id, date,
+                                    day_order, period_start_minutes, legan_id, legan_name, room_id, room_name, floor)
+    SELECT sl.student_id, e.Exam_id, e.program, e.code_course, e.type, e.day, e.period_id, e.date,
+           e.day_order, e.period_start_minutes, l.Legan_id, l.legan_name, r.room_id, r.room_name, r.floor
+    FROM new_rows sl
+    JOIN exam e ON e.Exam_id = sl.exam
+    LEFT JOIN legan l ON l.Legan_id = sl.legan_id
+    LEFT JOIN rooms r ON r.room_id = l.room_id
+    WHERE sl.student_id IS NOT NULL
+    ON CONFLICT (student_id, exam_id) DO UPDATE SET
+        program = EXCLUDED.program, code_course = EXCLUDED.code_course, type = EXCLUDED.type,
+        day = EXCLUDED.day, period_id = EXCLUDED.period_id, date = EXCLUDED.date,
+        day_order = EXCLUDED.day_order, period_start_minutes = EXCLUDED.period_start_minutes,
+        legan_id = EXCLUDED.legan_id, legan_name = EXCLUDED.legan_name, room_id = EXCLUDED.room_id,
+        room_name = EXCLUDED.room_name, floor = EXCLUDED.floor, refreshed_at = NOW();
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION seat_index_remove() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM student_seat_index s
+    USING old_rows o
+    WHERE s.student_id = o.student_id AND s.exam_id = o.exam;
+    RETURN NULL;
+END $$;
+
+-- UPDATE: seats whose (student, exam) changed lose their old entry;
+-- seat_index_upsert() (second UPDATE trigger) writes the new ones
+CREATE OR REPLACE FUNCTION seat_index_drop_moved() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM student_seat_index s
+    USING old_rows o
+    WHERE s.student_id = o.student_id AND s.exam_id = o.exam
+      AND NOT EXISTS (SELECT 1 FROM new_rows n WHERE n.student_id = o.student_id AND n.exam = o.exam);
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION seat_index_clear() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    TRUNCATE student_seat_index;
+    RETURN NULL;
+END $$;
+
+-- no seats may change between the backfill and the triggers going live
+LOCK TABLE student_legan IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS student_legan_seat_index_ins ON student_legan;
+DROP TRIGGER IF EXISTS student_legan_seat_index_del ON student_legan;
+DROP TRIGGER IF EXISTS student_legan_seat_index_upd_drop ON student_legan;
+DROP TRIGGER IF EXISTS student_legan_seat_index_upd ON student_legan;
+DROP TRIGGER IF EXISTS student_legan_seat_index_trunc ON student_legan;
+CREATE TRIGGER student_legan_seat_index_ins AFTER INSERT ON student_legan
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE seat_index_upsert();
+CREATE TRIGGER student_legan_seat_index_del AFTER DELETE ON student_legan
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE seat_index_remove();
+CREATE TRIGGER student_legan_seat_index_upd_drop AFTER UPDATE ON student_legan
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE seat_index_drop_moved();
+CREATE TRIGGER student_legan_seat_index_upd AFTER UPDATE ON student_legan
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE seat_index_upsert();
+CREATE TRIGGER student_legan_seat_index_trunc AFTER TRUNCATE ON student_legan
+    FOR EACH STATEMENT EXECUTE PROCEDURE seat_index_clear();
+
+INSERT INTO student_seat_index (student_id, exam_id, program, code_course, type, day, period_id, date,
+                                day_order, period_start_minutes, legan_id, legan_name, room_id, room_name, floor)
+SELECT sl.student_id, e.Exam_id, e.program, e.code_course, e.type, e.day, e.period_id, e.date,
+       e.day_order, e.period_start_minutes, l.Legan_id, l.legan_name, r.room_id, r.room_name, r.floor
+FROM student_legan sl
+JOIN exam e ON e.Exam_id = sl.exam
+LEFT JOIN legan l ON l.Legan_id = sl.legan_id
+LEFT JOIN rooms r ON r.room_id = l.room_id
+WHERE sl.student_id IS NOT NULL
+ON CONFLICT (student_id, exam_id) DO NOTHING;
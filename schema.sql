@@ -7,6 +7,13 @@ CREATE TABLE IF NOT EXISTS doctors (
     phone VARCHAR(50)
 );
 
+CREATE TABLE IF NOT EXISTS programs (
+    program_id VARCHAR(50) PRIMARY KEY,
+    arabic_name VARCHAR(255),
+    English_name VARCHAR(255),
+    logo TEXT
+);
+
 CREATE TABLE IF NOT EXISTS rooms (
     room_id SERIAL PRIMARY KEY,
     room_name VARCHAR(255),
@@ -0,0 +1,79 @@
+import pytest
+
+from api import cache as cachemod
+from api.cache import ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cachemod.time, 'monotonic', lambda: now[0])
+    return now
+
+def key(name, **args):
+    return ResponseCache.make_key(name, args)
+
+
+def test_make_key_ignores_order_and_blank_args():
+    assert key('rooms', a='1', b=' 2 ', c='') == key('rooms', b='2', a='1')
+
+def test_hit_after_put():
+    store = ResponseCache(max_entries=4, max_bytes=1024, ttl=0, shared=False)
+    entry, token = store.get(key('rooms'))
+    assert entry is None
+    store.put(key('rooms'), b'[]', None, token)
+    entry, _ = store.get(key('rooms'))
+    assert entry.body == b'[]'
+    assert store.stats()['hits'] == 1 and store.stats()['misses'] == 1
+
+def test_lru_eviction_by_entries():
+    store = ResponseCache(max_entries=2, max_bytes=1024, ttl=0, shared=False)
+    for name in ('a', 'b'):
+        store.put(key(name), b'x')
+    store.get(key('a'))              # a is now the most recently used
+    store.put(key('c'), b'x')
+    assert store.get(key('b'))[0] is None
+    assert store.get(key('a'))[0] is not None
+    assert store.stats()['evictions'] == 1
+
+def test_eviction_by_bytes_and_oversized_bodies():
+    store = ResponseCache(max_entries=10, max_bytes=10, ttl=0, shared=False)
+    store.put(key('a'), b'12345')
+    store.put(key('b'), b'123456')
+    assert store.get(key('a'))[0] is None
+    store.put(key('big'), b'x' * 11)
+    assert store.get(key('big'))[0] is None
+    assert store.stats()['bytes'] == 6
+
+def test_ttl_expiry(clock):
+    store = ResponseCache(max_entries=4, max_bytes=1024, ttl=30, shared=False)
+    store.put(key('a'), b'1')
+    clock[0] += 29
+    assert store.get(key('a'))[0] is not None
+    clock[0] += 2
+    assert store.get(key('a'))[0] is None
+    assert store.stats()['entries'] == 0
+
+def test_invalidate_by_exam_ids():
+    store = ResponseCache(max_entries=10, max_bytes=1024, ttl=0, shared=False)
+    store.put(key('sl', exam_id='1'), b'1', {1})
+    store.put(key('sl', exam_id='2'), b'2', {2})
+    store.put(key('sl'), b'all', None)
+    store.put(key('rooms'), b'r', None)
+    store.invalidate('sl', [1])
+    assert store.get(key('sl', exam_id='1'))[0] is None
+    assert store.get(key('sl'))[0] is None
+    assert store.get(key('sl', exam_id='2'))[0] is not None
+    assert store.get(key('rooms'))[0] is not None
+
+def test_miss_computed_before_invalidation_is_not_stored():
+    store = ResponseCache(max_entries=4, max_bytes=1024, ttl=0, shared=False)
+    _, token = store.get(key('sl'))
+    # a mutation lands while the producer is still running
+    store.invalidate('sl')
+    entry = store.put(key('sl'), b'stale', None, token)
+    assert entry.body == b'stale'       # still served to this request
+    assert store.get(key('sl'))[0] is None
+    _, token = store.get(key('sl'))
+    store.put(key('sl'), b'fresh', None, token)
+    assert store.get(key('sl'))[0].body == b'fresh'
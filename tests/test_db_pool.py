@@ -0,0 +1,176 @@
+import threading
+
+import psycopg2.extensions
+import pytest
+
+import db as dbmod
+from db import ConnectionPool, PoolTimeout
+
+IDLE = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+INTRANS = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.conn.ping_fails:
+            raise psycopg2.OperationalError('server closed the connection')
+
+
+class FakeConn:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.status = IDLE
+        self.rollbacks = 0
+        self.ping_fails = False
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class Connector:
+    def __init__(self, fail_after=None):
+        self.opened = []
+        self.fail_after = fail_after
+
+    def __call__(self):
+        if self.fail_after is not None and len(self.opened) >= self.fail_after:
+            raise psycopg2.OperationalError('could not connect')
+        conn = FakeConn()
+        self.opened.append(conn)
+        return conn
+
+
+def make_pool(connect=None, **kwargs):
+    kwargs.setdefault('minconn', 0)
+    kwargs.setdefault('maxconn', 2)
+    kwargs.setdefault('timeout', 0.05)
+    kwargs.setdefault('ping_after', None)
+    kwargs.setdefault('max_lifetime', None)
+    return ConnectionPool(connect=connect or Connector(), **kwargs)
+
+
+def test_checkout_reuses_returned_connection():
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert pool.stats()['created'] == 1
+
+
+def test_timeout_when_exhausted():
+    pool = make_pool(maxconn=1)
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_waiter_gets_connection_when_returned():
+    pool = make_pool(maxconn=1, timeout=2)
+    conn = pool.getconn()
+    got = []
+    t = threading.Thread(target=lambda: got.append(pool.getconn()))
+    t.start()
+    pool.putconn(conn)
+    t.join(2)
+    assert got == [conn]
+
+
+def test_failed_connect_releases_its_slot():
+    connect = Connector(fail_after=0)
+    pool = make_pool(connect=connect, maxconn=1)
+    with pytest.raises(psycopg2.OperationalError):
+        pool.getconn()
+    connect.fail_after = None
+    assert pool.getconn() is connect.opened[0]
+
+
+def test_failed_fill_does_not_shrink_the_pool():
+    connect = Connector(fail_after=1)
+    pool = make_pool(connect=connect, minconn=5, maxconn=6)
+    with pytest.raises(psycopg2.OperationalError):
+        pool.fill()
+    assert pool._opening == 0
+    assert pool.stats()['size'] == 1
+    connect.fail_after = None
+    conns = [pool.getconn() for _ in range(6)]
+    assert len({id(c) for c in conns}) == 6
+
+
+def test_fill_opens_up_to_minconn():
+    connect = Connector()
+    pool = make_pool(connect=connect, minconn=3, maxconn=5)
+    pool.fill()
+    pool.fill()
+    assert len(connect.opened) == 3
+    assert pool.stats()['idle'] == 3
+
+
+def test_failed_ping_discards_and_reconnects():
+    connect = Connector()
+    pool = make_pool(connect=connect, ping_after=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.ping_fails = True
+    fresh = pool.getconn()
+    assert fresh is not conn
+    assert conn.closed
+    stats = pool.stats()
+    assert stats['pings_failed'] == 1 and stats['discarded'] == 1
+
+
+def test_return_inside_transaction_rolls_back():
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.status = INTRANS
+    pool.putconn(conn)
+    assert conn.rollbacks == 1
+    assert pool.getconn() is conn
+
+
+def test_return_with_unknown_status_discards():
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.status = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+    pool.putconn(conn)
+    assert conn.closed
+    assert pool.stats()['size'] == 0
+
+
+def test_foreign_connection_is_closed():
+    pool = make_pool()
+    stranger = FakeConn()
+    pool.putconn(stranger)
+    assert stranger.closed
+    assert pool.stats()['idle'] == 0
+
+
+def test_connection_context_returns_on_error(monkeypatch):
+    pool = make_pool()
+    monkeypatch.setattr(dbmod, 'get_pool', lambda: pool)
+    with pytest.raises(ValueError):
+        with dbmod.connection() as conn:
+            conn.status = INTRANS
+            raise ValueError('boom')
+    assert conn.rollbacks == 1
+    assert pool.stats()['in_use'] == 0
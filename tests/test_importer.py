@@ -0,0 +1,61 @@
+import io
+
+import pandas as pd
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from api import importer
+
+
+def test_missing_columns_is_case_and_space_insensitive():
+    df = pd.DataFrame(columns=[' ROOM_NAME ', 'floor'])
+    assert importer.missing_columns(df, importer.SPECS['rooms']) == ['capacity']
+
+def test_optional_columns_are_not_required():
+    df = pd.DataFrame(columns=['room_name', 'capacity'])
+    assert importer.missing_columns(df, importer.SPECS['rooms']) == []
+
+def test_validate_coerces_and_rejects():
+    df = pd.DataFrame({
+        'Legan_id': ['1', '2.0', 'x', '4', '5.5'],
+        'legan_name': ['A', 'B', 'C', '', 'E'],
+        'capacity': ['10', '0', '3', '-1', '2'],
+        'program': ['cs', 'it', 'cs', 'cs', 'cs'],
+    })
+    clean, reasons = importer.validate(df, importer.SPECS['legans'])
+    assert list(clean['Legan_id'][:2]) == [1, 2]
+    assert list(clean['program'][:2]) == ['CS', 'IT']
+    assert list(reasons[:2]) == ['', '']
+    assert reasons[2] == 'Legan_id: not a number; Legan_id: required'
+    assert reasons[3] == 'legan_name: required; capacity: must be >= 0'
+    assert reasons[4] == 'Legan_id: not an integer'
+    assert clean['room_id'].isna().all()
+
+def test_validate_strips_excel_float_suffix():
+    df = pd.DataFrame({'student_ID': ['20230001.0', ' 42 ']})
+    clean, reasons = importer.validate(df, importer.SPECS['students'])
+    assert list(clean['student_ID']) == ['20230001', '42']
+    assert (reasons == '').all()
+
+def test_empty_csv_is_an_import_error():
+    upload = FileStorage(stream=io.BytesIO(b''), filename='rooms.csv')
+    with pytest.raises(importer.ImportFileError):
+        list(importer.read_chunks(upload))
+
+def test_csv_chunks_keep_sheet_row_numbers():
+    data = b'room_name,capacity\nA,10\n,\nB,20\n'
+    chunks = list(importer.read_chunks(FileStorage(stream=io.BytesIO(data), filename='r.csv'), chunk_rows=2))
+    assert [n for _, numbers in chunks for n in numbers] == [2, 4]
+
+@pytest.mark.parametrize('kind, on_conflict, expected', [
+    ('exams', None, 'skip'),
+    ('legans', 'update', 'update'),
+    ('rooms', None, None),
+])
+def test_check_options(kind, on_conflict, expected):
+    assert importer.check_options(kind, on_conflict) == expected
+
+@pytest.mark.parametrize('kind, on_conflict', [('students', 'skip'), ('exams', 'replace'), ('nope', None)])
+def test_check_options_rejects(kind, on_conflict):
+    with pytest.raises(importer.ImportFileError):
+        importer.check_options(kind, on_conflict)
@@ -0,0 +1,68 @@
+from collections import Counter
+
+from api import planner
+
+
+def exam(exam_id, program='CS', level='1', course='C1'):
+    return {'exam_id': exam_id, 'program': program, 'level': level, 'code_course': course,
+            'day': 'Sun', 'period_id': '1', 'date': '2026-01-10'}
+
+def legan(legan_id, room_id, capacity, program='CS', level='1'):
+    return {'legan_id': legan_id, 'legan_name': f'L{legan_id}', 'room_id': room_id, 'level': level,
+            'capacity': capacity, 'program': program}
+
+def students(prefix, n):
+    return [{'student_id': f'{prefix}{i:04d}', 'student_name': f'{prefix} {i}'} for i in range(n)]
+
+
+def test_uses_the_fewest_rooms():
+    legans = {('CS', '1'): [legan(1, 10, 20), legan(2, 10, 20), legan(3, 11, 60), legan(4, 12, 30)]}
+    regs = {('CS', 'C1'): students('s', 50)}
+    placements, summaries = planner.pack_slot([exam(1)], legans, regs, {})
+    assert len(placements) == 50
+    assert {lid for lid, _, _ in placements} == {3}
+    assert summaries[0]['assigned'] == 50 and summaries[0]['unseated'] == 0
+
+def test_respects_capacity_and_occupancy():
+    legans = {('CS', '1'): [legan(1, 10, 10), legan(2, 11, 10)]}
+    regs = {('CS', 'C1'): students('s', 25)}
+    placements, summaries = planner.pack_slot([exam(1)], legans, regs, {1: 4})
+    per_legan = Counter(lid for lid, _, _ in placements)
+    assert per_legan == {1: 6, 2: 10}
+    assert summaries[0]['assigned'] == 16 and summaries[0]['unseated'] == 9
+    # every student is seated at most once
+    assert len({sid for _, sid, _ in placements}) == 16
+
+def test_prefers_rooms_already_open_in_the_slot():
+    legans = {('CS', '1'): [legan(1, 10, 40), legan(2, 11, 40)]}
+    regs = {('CS', 'C1'): students('s', 10)}
+    placements, _ = planner.pack_slot([exam(1)], legans, regs, {2: 1})
+    assert {lid for lid, _, _ in placements} == {2}
+
+def test_exams_sharing_a_pool_do_not_overbook():
+    legans = {('CS', '1'): [legan(1, 10, 30)]}
+    regs = {('CS', 'C1'): students('a', 20), ('CS', 'C2'): students('b', 20)}
+    exams = [exam(1, course='C1'), exam(2, course='C2')]
+    placements, summaries = planner.pack_slot(exams, legans, regs, {})
+    assert len(placements) == 30
+    assert sum(s['assigned'] for s in summaries) == 30
+    assert all(s['filled'] <= s['capacity'] for x in summaries for s in x.get('legans', []))
+
+def test_alternate_mixes_courses_seat_by_seat():
+    legans = {('CS', '1'): [legan(1, 10, 10)]}
+    regs = {('CS', 'C1'): students('a', 5), ('CS', 'C2'): students('b', 5)}
+    exams = [exam(1, course='C1'), exam(2, course='C2')]
+    placements, _ = planner.pack_slot(exams, legans, regs, {}, alternate=True)
+    assert [e for _, _, e in placements] == [1, 2] * 5
+
+def test_missing_legans_or_students_are_reported():
+    legans = {('CS', '1'): [legan(1, 10, 10)]}
+    regs = {('CS', 'C1'): students('a', 3)}
+    exams = [exam(1, course='C1'), exam(2, course='C9'), exam(3, level='2')]
+    placements, summaries = planner.pack_slot(exams, legans, regs, {})
+    errors = {s['exam_id']: s.get('error') for s in summaries}
+    assert errors[1] is None
+    assert errors[2] == 'No registered students for this course'
+    assert errors[3] == 'No legans available for this program/level'
+    assert [s['exam_id'] for s in summaries] == [1, 2, 3]
+    assert len(placements) == 3
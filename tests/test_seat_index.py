@@ -0,0 +1,21 @@
+from datetime import date
+
+import pytest
+
+from api.seat_index import is_upcoming
+
+TODAY = date(2026, 1, 10)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2026-01-10', True),
+    ('2026-01-11', True),
+    ('2026-01-09', False),
+    ('2026-01-09T08:00:00', False),
+    (date(2026, 2, 1), True),
+    (None, True),
+    ('', True),
+    ('next week', True),
+])
+def test_is_upcoming(value, expected):
+    assert is_upcoming(value, TODAY) is expected
@@ -0,0 +1,52 @@
+from collections import Counter
+
+from api import seating
+
+
+def exam(exam_id, course):
+    return {'exam_id': exam_id, 'program': 'CS', 'level': '1', 'code_course': course,
+            'day': 'Sun', 'period_id': '1', 'date': '2026-01-10'}
+
+def legan(legan_id, capacity):
+    return {'legan_id': legan_id, 'legan_name': f'L{legan_id}', 'room_id': legan_id, 'level': '1',
+            'capacity': capacity, 'program': 'CS'}
+
+def students(prefix, n):
+    return [{'student_id': f'{prefix}{i:04d}', 'student_name': f'{prefix} {i}'} for i in range(n)]
+
+LEGANS = [legan(1, 30), legan(2, 30)]
+
+
+def test_plan_seats_fills_in_order_around_occupied_seats():
+    placements, fill = seating.plan_seats(LEGANS, students('s', 40), {1: 25}, exam_id=7)
+    assert fill == {1: 5, 2: 30}
+    assert len(placements) == 35
+    assert {e for _, _, e in placements} == {7}
+
+def test_plan_slot_shares_legans_between_exams():
+    legans_by_key = {('CS', '1'): LEGANS}
+    students_by_key = {('CS', 'A'): students('a', 25), ('CS', 'B'): students('b', 25)}
+    placements, summaries = seating.plan_slot([exam(1, 'A'), exam(2, 'B')], legans_by_key, students_by_key, {})
+    assert Counter(lid for lid, _, _ in placements) == {1: 30, 2: 20}
+    assert [s['assigned'] for s in summaries] == [25, 25]
+
+def test_plan_slot_reports_missing_students():
+    _, summaries = seating.plan_slot([exam(1, 'Z')], {('CS', '1'): LEGANS}, {}, {})
+    assert summaries[0]['error'] == 'No registered students for this course'
+
+def test_reassign_respects_seats_of_other_exams_in_the_slot():
+    legans_by_key = {('CS', '1'): LEGANS}
+    students_by_key = {('CS', 'A'): students('a', 25), ('CS', 'B'): students('b', 25)}
+    batch, _ = seating.plan_slot([exam(1, 'A'), exam(2, 'B')], legans_by_key, students_by_key, {})
+    slot_occupied = Counter(lid for lid, _, _ in batch)            # {1: 30, 2: 20}
+    last_used = max(lid for lid, _, e in batch if e == 1)          # exam 1 only used L1
+
+    placements, fill = seating.plan_reassign(LEGANS, students('late', 3), slot_occupied, last_used, exam_id=1)
+    assert fill == {2: 3}
+    seats = slot_occupied + Counter(lid for lid, _, _ in placements)
+    assert all(seats[leg['legan_id']] <= leg['capacity'] for leg in LEGANS)
+
+def test_reassign_starts_from_the_last_used_legan():
+    legans = [legan(1, 10), legan(2, 10), legan(3, 10)]
+    _, fill = seating.plan_reassign(legans, students('late', 12), {1: 2, 2: 4}, 2, exam_id=1)
+    assert fill == {2: 6, 3: 6}